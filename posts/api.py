@@ -0,0 +1,154 @@
+"""JSON API лент и поста.
+
+Строки берутся через values() и сразу пишутся в JSON, без моделей и
+шаблонов; ленты отдаются потоком. Условные запросы — как у HTML-лент,
+см. http_cache.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from yatube.db.replicas import read_only
+
+from . import feed_cache
+from .http_cache import conditional, validators
+from .models import Group, Post, User
+from .paginator import NEXT, PER_PAGE, CursorPaginator
+from .storage import post_image_storage
+from .timeline import follow_feed, heavy_authors
+
+MAX_LIMIT = 100
+
+FIELDS = ('id', 'text', 'pub_date', 'updated', 'image', 'comment_count',
+          'like_count')
+
+
+def _rows(queryset):
+    return queryset.values(*FIELDS, author_name=F('author__username'),
+                           group_slug=F('group__slug'))
+
+
+def _post(row):
+    image = row['image']
+    return {
+        'id': row['id'],
+        'author': row['author_name'],
+        'group': row['group_slug'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'updated': row['updated'],
+        'image': post_image_storage.url(image) if image else None,
+        'comment_count': row['comment_count'],
+        'like_count': row['like_count'],
+    }
+
+
+def _dump(row):
+    return json.dumps(_post(row), cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def _limit(request):
+    limit = request.GET.get('limit', '')
+    if not limit.isdigit():
+        return PER_PAGE
+    return max(1, min(int(limit), MAX_LIMIT))
+
+
+def _validators(request, scopes, *extra):
+    return validators(scopes, request.GET.get('cursor'), _limit(request),
+                      *extra)
+
+
+def _stream(rows, limit, paginator):
+    yield '{"results": ['
+    last = None
+    has_more = False
+    for number, row in enumerate(rows):
+        if number == limit:
+            has_more = True
+            break
+        yield (', ' if number else '') + _dump(row)
+        last = row
+    next_cursor = paginator.encode_cursor(last, NEXT) if has_more else None
+    yield '], "next_cursor": %s}' % json.dumps(next_cursor)
+
+
+def _feed(request, queryset, scopes, *extra):
+    etag, last_modified = _validators(request, scopes, *extra)
+
+    def respond():
+        limit = _limit(request)
+        # Поток читается уже после выхода из view, поэтому база для
+        # чтения выбирается сейчас, пока действует read_only.
+        paginator = CursorPaginator(
+            _rows(queryset.using(router.db_for_read(Post))), limit)
+        rows = paginator.seek(request.GET.get('cursor'))[2]
+        return StreamingHttpResponse(_stream(rows[:limit + 1].iterator(),
+                                             limit, paginator),
+                                     content_type='application/json')
+
+    return conditional(request, etag, last_modified, respond)
+
+
+@require_GET
+@read_only
+def index(request):
+    return _feed(request, Post.objects.all(), [feed_cache.GLOBAL])
+
+
+@require_GET
+@read_only
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed(request, Post.objects.filter(group=group),
+                 [feed_cache.scope(feed_cache.GROUP, group.pk)])
+
+
+@require_GET
+@read_only
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return _feed(request, Post.objects.filter(author=author),
+                 [feed_cache.scope(feed_cache.AUTHOR, author.pk)])
+
+
+@require_GET
+@read_only
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Нужно войти.'}, status=401)
+    heavy = heavy_authors(request.user)
+    response = _feed(request, follow_feed(request.user, heavy),
+                     feed_cache.follow_scopes(request.user, heavy),
+                     request.user.pk)
+    patch_cache_control(response, private=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+@require_GET
+@read_only
+def post_detail(request, username, post_id):
+    author_id = get_object_or_404(
+        Post.objects.values_list('author_id', flat=True),
+        author__username=username, id=post_id)
+    # Версия автора меняется при любой правке, комментарии или лайке
+    # его постов, так что её хватает и для одного поста.
+    etag, last_modified = _validators(
+        request, [feed_cache.scope(feed_cache.AUTHOR, author_id)], post_id)
+
+    def respond():
+        row = _rows(Post.objects.filter(pk=post_id)).get()
+        body = _post(row)
+        body['comments_url'] = reverse('post_comments',
+                                       args=(username, post_id))
+        return JsonResponse(body, json_dumps_params={'ensure_ascii': False})
+
+    return conditional(request, etag, last_modified, respond)
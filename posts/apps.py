@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa
+        from .search.suggest import suggester
+
+        request_started.connect(suggester.warm_up,
+                                dispatch_uid='suggester_warm_up')
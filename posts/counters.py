@@ -0,0 +1,109 @@
+from django.db import router
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+Like = Post.likes.through
+
+
+def count_subquery(queryset, field):
+    counts = (queryset.filter(**{field: OuterRef('pk')})
+              .order_by()
+              .values(field)
+              .annotate(count=Count('pk'))
+              .values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def post_counters():
+    return {
+        'comment_count': count_subquery(Comment.objects.all(), 'post'),
+        'like_count': count_subquery(Like.objects.all(), 'post'),
+    }
+
+
+def user_counters():
+    return {
+        'followers_count': count_subquery(Follow.objects.all(), 'author'),
+        'following_count': count_subquery(Follow.objects.all(), 'user'),
+        'posts_count': count_subquery(Post.objects.all(), 'author'),
+    }
+
+
+def _bump(queryset, field, delta):
+    if delta < 0:
+        # Не уходим в минус: такое расхождение исправит reconcile_counters.
+        queryset = queryset.filter(**{field + '__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump_user(user_id, field, delta):
+    if user_id is not None:
+        _bump(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def bump_post(post_id, field, delta):
+    if post_id is not None:
+        _bump(Post.objects.filter(pk=post_id), field, delta)
+
+
+def bump_replies(comment_ids, delta):
+    if comment_ids:
+        _bump(Comment.objects.filter(pk__in=comment_ids), 'reply_count', delta)
+
+
+def recount_likes(post_ids):
+    Post.objects.filter(pk__in=post_ids).update(
+        like_count=post_counters()['like_count'])
+
+
+def recount_posts(posts=None):
+    if posts is None:
+        posts = Post.objects.all()
+    return posts.update(**post_counters())
+
+
+def recount_users(users=None):
+    if users is None:
+        users = User.objects.all()
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in users.values_list('pk', flat=True)],
+        batch_size=500, ignore_conflicts=True,
+    )
+    stats = UserStats.objects.filter(user__in=users.values('pk'))
+    return stats.update(**user_counters())
+
+
+def stale_posts():
+    counters = post_counters()
+    return Post.objects.annotate(
+        actual_comments=counters['comment_count'],
+        actual_likes=counters['like_count'],
+    ).exclude(
+        comment_count=F('actual_comments'),
+        like_count=F('actual_likes'),
+    )
+
+
+def stale_users():
+    counters = user_counters()
+    return UserStats.objects.annotate(
+        actual_followers=counters['followers_count'],
+        actual_following=counters['following_count'],
+        actual_posts=counters['posts_count'],
+    ).exclude(
+        followers_count=F('actual_followers'),
+        following_count=F('actual_following'),
+        posts_count=F('actual_posts'),
+    )
+
+
+def user_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recount_users(User.objects.filter(pk=user.pk))
+        # Только что записано: на реплике строки ещё нет.
+        return UserStats.objects.using(router.db_for_write(UserStats)) \
+            .get(pk=user.pk)
@@ -0,0 +1,154 @@
+"""Версии лент для кэша фрагментов.
+
+У каждой ленты (главная, группа, автор, подписки пользователя) есть
+версия в кэше. Она входит в ключ фрагмента, поэтому фрагменты можно
+хранить долго: сигналы меняют версию, и старые ключи больше не читаются.
+
+Карточки постов кэшируются отдельно, ключ собирается из id, времени
+изменения, миниатюры, группы, счётчиков, того, вошёл ли зритель, видит
+ли карточку автор и отмечен ли пост лайком. Поэтому карточки общие для
+всех пользователей.
+Страница ленты достаёт все карточки одним get_many и рендерит только
+недостающие.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from yatube.db.replicas import generation as replica_generation
+
+from .models import Follow, Post
+from .timeline import is_heavy
+
+GLOBAL = 'global'
+GROUP = 'group'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+
+
+def fragment_timeout():
+    return getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60)
+
+
+def scope(kind, pk):
+    return '%s:%s' % (kind, pk)
+
+
+def _version_key(name):
+    return 'feed_version:' + name
+
+
+def _new_version():
+    # Время в версии нужно для Last-Modified, см. last_modified.
+    return '%d.%s' % (time.time(), uuid.uuid4().hex[:12])
+
+
+def versions(scopes):
+    keys = [_version_key(name) for name in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        # Пропавшая версия заменяется новой, а не нулём: иначе после
+        # вытеснения из кэша снова прочитались бы старые фрагменты.
+        cache.set_many(missing, None)
+        found.update(missing)
+    result = [found[key] for key in keys]
+    snapshot = replica_generation()
+    if snapshot:
+        # Страница с реплики зависит и от её снимка, см. yatube.db.replicas.
+        result.append(snapshot)
+    return result
+
+
+def last_modified(scopes):
+    """Время последнего изменения лент по их версиям, без запросов к
+    базе. Версия без времени считается новой."""
+    stamps = []
+    for version in versions(scopes):
+        stamp = version.partition('.')[0]
+        stamps.append(int(stamp) if stamp.isdigit() else time.time())
+    return datetime.fromtimestamp(max(stamps), timezone.utc)
+
+
+def bump(scopes):
+    scopes = set(scopes)
+    if scopes:
+        cache.set_many(
+            {_version_key(name): _new_version() for name in scopes}, None)
+
+
+def post_scopes(author_id, group_ids=()):
+    """Ленты, в которых показывается пост автора из указанных групп."""
+    scopes = [GLOBAL]
+    scopes.extend(scope(GROUP, pk) for pk in group_ids if pk is not None)
+    if author_id is None:
+        return scopes
+    scopes.append(scope(AUTHOR, author_id))
+    if not is_heavy(author_id):
+        # Ленты подписчиков популярных авторов зависят от версии автора,
+        # см. follow_scopes, и здесь не перечисляются.
+        followers = (Follow.objects
+                     .filter(author_id=author_id, user__isnull=False)
+                     .values_list('user_id', flat=True).distinct())
+        scopes.extend(scope(FOLLOWER, pk) for pk in followers)
+    return scopes
+
+
+def follow_scopes(user, heavy_authors):
+    return ([scope(FOLLOWER, user.pk)]
+            + [scope(AUTHOR, pk) for pk in heavy_authors])
+
+
+def bump_posts(post_ids):
+    for author_id, group_id in (Post.objects.filter(pk__in=post_ids)
+                                .values_list('author_id', 'group_id')):
+        bump(post_scopes(author_id, [group_id]))
+
+
+def bump_group(group_id):
+    """Ленты, где видны посты группы: в карточках есть её название."""
+    scopes = [GLOBAL, scope(GROUP, group_id)]
+    authors = (Post.objects.filter(group_id=group_id)
+               .values_list('author_id', flat=True).distinct())
+    for author_id in authors:
+        scopes.extend(post_scopes(author_id))
+    bump(scopes)
+
+
+def _group_digest(post):
+    if post.group_id is None:
+        return ''
+    group = '%s %s' % (post.group.slug, post.group.title)
+    return hashlib.md5(group.encode()).hexdigest()[:12]
+
+
+def card_key(post, user, liked=False):
+    # Кнопка лайка показывается только вошедшим.
+    authenticated = user is not None and user.is_authenticated
+    is_author = authenticated and user.pk == post.author_id
+    # Миниатюра записывается через update(), updated при этом не меняется.
+    return 'post_card:%d:%s:%s:%s:%d:%d:%d:%d:%d' % (
+        post.pk, post.updated.timestamp(), post.thumbnail,
+        _group_digest(post), post.comment_count, post.like_count,
+        authenticated, is_author, liked,
+    )
+
+
+def render_cards(posts, user, liked=()):
+    keys = [card_key(post, user, post.pk in liked) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missing[key] = render_to_string(
+                'post_item.html', {'post': post, 'user': user,
+                                   'liked': post.pk in liked})
+    if missing:
+        cache.set_many(missing, fragment_timeout())
+        cards.update(missing)
+    return [cards[key] for key in keys]
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 
+from . import images
 from .models import Comment, Post
 
 
@@ -15,6 +17,12 @@ class PostForm(forms.ModelForm):
             },
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = images.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
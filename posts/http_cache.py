@@ -0,0 +1,61 @@
+"""HTTP-кэширование лент.
+
+ETag и Last-Modified считаются по версиям лент из feed_cache, поэтому
+ответ 304 отдаётся без рендеринга и без запросов к постам. Страницы для
+анонимов одинаковые у всех и помечаются public, их могут хранить прокси
+и cache_page. Страницы вошедших пользователей — private.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from . import feed_cache
+
+
+def validators(scopes, *extra):
+    """ETag и Last-Modified по версиям лент и всему, от чего ещё зависит
+    ответ."""
+    key = json.dumps([feed_cache.versions(scopes), extra], default=str)
+    etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+    return etag, int(feed_cache.last_modified(scopes).timestamp())
+
+
+def conditional(request, etag, last_modified, respond):
+    """Ответ 304, если клиент видел эту версию, иначе respond()."""
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is None:
+        response = respond()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def feed_response(request, scopes, extra, respond):
+    """Ответ HTML-ленты с заголовками кэширования.
+
+    extra — всё, что попадает на страницу помимо постов лент scopes.
+    """
+    if request.user.is_authenticated:
+        # Кнопкам лайков нужен CSRF-cookie, анонимам они не видны.
+        get_token(request)
+        response = respond()
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        etag, last_modified = validators(scopes, request.get_full_path(),
+                                         *extra)
+        response = conditional(request, etag, last_modified, respond)
+        if response.status_code in (200, 304):
+            patch_cache_control(
+                response, public=True,
+                max_age=getattr(settings, 'FEED_CACHE_MAX_AGE', 0),
+                stale_while_revalidate=getattr(
+                    settings, 'FEED_CACHE_STALE_WHILE_REVALIDATE', 60))
+    patch_vary_headers(response, ['Cookie'])
+    return response
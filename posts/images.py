@@ -0,0 +1,100 @@
+"""Нормализация картинок постов при загрузке.
+
+Размер картинки читается из заголовка, до декодирования пикселей, и
+слишком большие файлы отклоняются сразу. Остальные уменьшаются до
+POST_IMAGE_MAX_SIDE и пересохраняются без EXIF и прочих метаданных.
+Для JPEG декодер сам уменьшает картинку (draft), поэтому огромные фото
+не разворачиваются в памяти целиком.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils.translation import gettext_lazy as _
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'method': 4},
+}
+
+ANIMATED_FORMATS = ('GIF', 'PNG', 'WEBP')
+
+
+def max_upload_size():
+    return getattr(settings, 'POST_IMAGE_MAX_UPLOAD_SIZE', 20 * 1024 * 1024)
+
+
+def max_pixels():
+    return getattr(settings, 'POST_IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+
+
+def max_side():
+    return getattr(settings, 'POST_IMAGE_MAX_SIDE', 2048)
+
+
+def quality():
+    return getattr(settings, 'POST_IMAGE_QUALITY', 85)
+
+
+def _reencode(image):
+    image_format = image.format
+    if image_format not in SAVE_OPTIONS:
+        # GIF, BMP, TIFF, MPO и прочее: с прозрачностью или палитрой
+        # сохраняем без потерь, остальное — как фото.
+        lossless = image.mode in ('1', 'P', 'LA', 'RGBA')
+        image_format = 'PNG' if lossless else 'JPEG'
+    limit = max_side()
+    image.draft('RGB', (limit, limit))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    options = dict(SAVE_OPTIONS[image_format])
+    if image_format != 'PNG':
+        options['quality'] = quality()
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    content = BytesIO()
+    image.save(content, image_format, **options)
+    return image_format, content.getvalue()
+
+
+def normalize(upload):
+    if upload.size > max_upload_size():
+        raise ValidationError(
+            _('Файл больше %(limit)d МБ.'),
+            params={'limit': max_upload_size() // (1024 * 1024)},
+            code='file_too_large',
+        )
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+            if width * height > max_pixels():
+                raise ValidationError(
+                    _('Картинка слишком большая: %(width)d×%(height)d.'),
+                    params={'width': width, 'height': height},
+                    code='too_many_pixels',
+                )
+            # Пересохранение потеряло бы анимацию. Многокадровые MPO с
+            # камер — это JPEG с метаданными, их кадр пересохраняется.
+            if image.format in ANIMATED_FORMATS \
+                    and getattr(image, 'is_animated', False):
+                upload.seek(0)
+                return upload
+            image_format, content = _reencode(image)
+    except (OSError, Image.DecompressionBombError):
+        # Обрезанный или битый файл проходит проверку Django (verify не
+        # декодирует пиксели) и ломается только здесь.
+        raise ValidationError(_('Не удалось прочитать картинку.'),
+                              code='invalid_image')
+
+    name = os.path.splitext(upload.name)[0] + '.' + (
+        'jpg' if image_format == 'JPEG' else image_format.lower())
+    return SimpleUploadedFile(name, content,
+                              content_type=Image.MIME[image_format])
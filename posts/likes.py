@@ -0,0 +1,75 @@
+"""Лайки постов.
+
+like и unlike пишут строку связи напрямую, без m2m_changed, и меняют
+счётчик like_count атомарным UPDATE ... SET like_count = like_count ± 1
+только если строка действительно появилась или исчезла. Повторный
+запрос ничего не меняет. liked_ids за один запрос отвечает, какие посты
+страницы понравились пользователю.
+
+С POST_COUNTERS_WRITE_BEHIND лайки сначала попадают в буфер
+posts.write_behind, и ответы учитывают ещё не записанные изменения.
+"""
+from django.db import IntegrityError, transaction
+
+from . import counters, feed_cache, write_behind
+from .models import Post
+
+Like = Post.likes.through
+
+
+def like(post, user):
+    if write_behind.enabled():
+        return write_behind.buffer.set_like(post.pk, user.pk, True)
+    try:
+        with transaction.atomic():
+            Like.objects.create(post_id=post.pk, user_id=user.pk)
+            counters.bump_post(post.pk, 'like_count', 1)
+    except IntegrityError:
+        return False
+    feed_cache.bump_posts([post.pk])
+    return True
+
+
+def unlike(post, user):
+    if write_behind.enabled():
+        return write_behind.buffer.set_like(post.pk, user.pk, False)
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(post_id=post.pk,
+                                         user_id=user.pk).delete()
+        if deleted:
+            counters.bump_post(post.pk, 'like_count', -deleted)
+    if deleted:
+        feed_cache.bump_posts([post.pk])
+    return bool(deleted)
+
+
+def liked_ids(user, post_ids):
+    post_ids = list(post_ids)
+    if user is None or not user.is_authenticated or not post_ids:
+        return set()
+    liked = set(Like.objects.filter(user_id=user.pk, post_id__in=post_ids)
+                .values_list('post_id', flat=True))
+    if write_behind.enabled():
+        pending = write_behind.buffer.pending_likes(user.pk, post_ids)
+        liked.difference_update(pending)
+        liked.update(post_id for post_id, value in pending.items() if value)
+    return liked
+
+
+def like_count(post_id):
+    count = Post.objects.values_list('like_count', flat=True).get(pk=post_id)
+    if write_behind.enabled():
+        count += write_behind.buffer.pending_like_delta(post_id)
+    return max(count, 0)
+
+
+def add_view(post):
+    if write_behind.views_enabled():
+        write_behind.buffer.add_view(post.pk)
+
+
+def view_count(post):
+    """Просмотры с учётом буфера; None, если просмотры не считаются."""
+    if not write_behind.views_enabled():
+        return None
+    return post.view_count + write_behind.buffer.pending_views(post.pk)
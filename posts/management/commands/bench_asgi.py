@@ -0,0 +1,92 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from yatube.asgi_bridge import WSGIBridge
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает, сколько медленных клиентов обслуживает процесс '
+            'с пулом потоков WSGI и через ASGI-обёртку с тем же пулом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/about/author/',
+                            help='Какую страницу запрашивать.')
+        parser.add_argument('--clients', type=int, default=200,
+                            help='Сколько клиентов приходит одновременно.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Сколько потоков обрабатывает запросы.')
+        parser.add_argument('--delay', type=float, default=0.2,
+                            help='Сколько секунд клиент отправляет запрос '
+                                 'и столько же читает ответ.')
+
+    def handle(self, *args, **options):
+        application = get_wsgi_application()
+        # Прогрев: шаблоны и URL-резолвер не должны попасть в замер.
+        self.wsgi_request(application, options, 0)
+        for name, bench in (('wsgi', self.bench_wsgi),
+                            ('asgi', self.bench_asgi)):
+            started = time.perf_counter()
+            bench(application, options)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name}: {options["clients"]} клиентов за {elapsed:.2f} с, '
+                f'{options["clients"] / elapsed:.0f} запросов/с')
+
+    def environ(self, options):
+        return {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': options['path'],
+            'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http', 'wsgi.input': None,
+        }
+
+    def wsgi_request(self, application, options, delay):
+        # Поток синхронного сервера занят, пока клиент шлёт запрос
+        # и пока читает ответ.
+        time.sleep(delay)
+        result = application(self.environ(options), lambda *args: None)
+        try:
+            for _ in result:
+                time.sleep(delay)
+        finally:
+            result.close()
+
+    def bench_wsgi(self, application, options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for _ in range(options['clients']):
+                pool.submit(self.wsgi_request, application, options,
+                            options['delay'])
+
+    def bench_asgi(self, application, options):
+        bridge = WSGIBridge(application, workers=options['workers'])
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': options['path'],
+            'query_string': b'', 'headers': [(b'host', b'localhost')],
+            'server': ('localhost', 80),
+        }
+        delay = options['delay']
+
+        async def client():
+            async def receive():
+                await asyncio.sleep(delay)
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.body' \
+                        and message.get('body'):
+                    await asyncio.sleep(delay)
+
+            await bridge(dict(scope), receive, send)
+
+        async def main():
+            await asyncio.gather(*(client()
+                                   for _ in range(options['clients'])))
+
+        try:
+            asyncio.run(main())
+        finally:
+            bridge.executor.shutdown()
@@ -0,0 +1,72 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import (
+    Command as CreateCacheTable)
+from django.db import connection
+
+from yatube.cache import SQLiteCache
+
+BENCH_TABLE = 'bench_cache_table'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку попадания в кэш у SQLiteCache, '
+            'LocMemCache и DatabaseCache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=1000,
+                            help='Сколько ключей положить в кэш.')
+        parser.add_argument('--reads', type=int, default=20000,
+                            help='Сколько раз прочитать ключи.')
+        parser.add_argument('--size', type=int, default=2048,
+                            help='Размер значения в байтах.')
+
+    def handle(self, *args, **options):
+        params = {'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2}}
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [
+                ('locmem', LocMemCache('bench', params)),
+                ('sqlite', SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'), params)),
+                ('db', DatabaseCache(BENCH_TABLE, params)),
+            ]
+            create = CreateCacheTable()
+            create.verbosity = 0
+            create.create_table('default', BENCH_TABLE, False)
+            try:
+                for name, cache in backends:
+                    self.bench(name, cache, options)
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('DROP TABLE %s'
+                                   % connection.ops.quote_name(BENCH_TABLE))
+
+    def bench(self, name, cache, options):
+        value = 'x' * options['size']
+        keys = ['bench:%d' % number for number in range(options['keys'])]
+        cache.set_many({key: value for key in keys}, None)
+        cache.set('bench:counter', 0, None)
+
+        timings = []
+        for number in range(options['reads']):
+            key = keys[number % len(keys)]
+            started = time.perf_counter()
+            cache.get(key)
+            timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            cache.incr('bench:counter')
+        incr = (time.perf_counter() - started) / 1000
+
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f'{name:>6}: get median {statistics.median(timings) * 1e6:.1f} '
+            f'мкс, p99 {p99 * 1e6:.1f} мкс, incr {incr * 1e6:.1f} мкс')
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+BACKENDS = (
+    ('django', 'django.db.backends.sqlite3'),
+    ('yatube', 'yatube.db.sqlite3'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает долю ошибок «database is locked» при конкурентной '
+            'записи у стандартного бэкенда SQLite и yatube.db.sqlite3.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Сколько потоков пишут одновременно.')
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Сколько транзакций делает каждый поток.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, engine in BACKENDS:
+                alias = 'bench_' + name
+                connections.databases[alias] = {
+                    'ENGINE': engine,
+                    'NAME': os.path.join(directory, name + '.sqlite3'),
+                }
+                connections.ensure_defaults(alias)
+                try:
+                    self.bench(name, alias, options)
+                finally:
+                    del connections.databases[alias]
+
+    def bench(self, name, alias, options):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, '
+                           'thread INTEGER, value INTEGER)')
+        errors = []
+        lock = threading.Lock()
+
+        def write(thread):
+            failed = 0
+            try:
+                for number in range(options['writes']):
+                    # Как add_comment: сначала чтение, потом запись.
+                    try:
+                        with transaction.atomic(using=alias):
+                            with connections[alias].cursor() as cursor:
+                                cursor.execute(
+                                    'SELECT COUNT(*) FROM bench '
+                                    'WHERE thread = %s', [thread])
+                                cursor.execute(
+                                    'INSERT INTO bench (thread, value) '
+                                    'VALUES (%s, %s)', [thread, number])
+                    except OperationalError:
+                        failed += 1
+            finally:
+                connections[alias].close()
+            with lock:
+                errors.append(failed)
+
+        threads = [threading.Thread(target=write, args=(number,))
+                   for number in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = options['threads'] * options['writes']
+        failed = sum(errors)
+        self.stdout.write(
+            f'{name:>6}: {total - failed} из {total} транзакций, '
+            f'ошибок блокировки {failed} ({failed / total:.1%}), '
+            f'{(total - failed) / elapsed:.0f} транзакций/с')
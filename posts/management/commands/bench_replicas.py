@@ -0,0 +1,101 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from posts.models import Post
+from yatube.db.replicas import snapshot
+
+PRIMARY = 'bench_primary'
+REPLICA = 'bench_replica'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость чтения ленты из основной базы под записью '
+            'и из реплики-снимка.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Сколько потоков читают ленту.')
+        parser.add_argument('--seconds', type=float, default=3,
+                            help='Сколько секунд длится каждый замер.')
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            # Замер идёт на копиях, рабочая база не меняется.
+            primary = os.path.join(directory, 'primary.sqlite3')
+            replica = os.path.join(directory, 'replica.sqlite3')
+            snapshot(source, primary)
+            snapshot(primary, replica)
+            self.add_database(PRIMARY, primary, {})
+            self.add_database(REPLICA, replica, {
+                'pragmas': {'journal_mode': 'DELETE', 'query_only': 1}})
+            with connections[PRIMARY].cursor() as cursor:
+                cursor.execute('CREATE TABLE bench_writes '
+                               '(id INTEGER PRIMARY KEY, value BLOB)')
+            try:
+                for alias in (PRIMARY, REPLICA):
+                    reads, writes = self.bench(alias, options)
+                    seconds = options['seconds']
+                    self.stdout.write(
+                        f'{alias}: чтений ленты {reads / seconds:.0f}/с, '
+                        f'записей в основную базу {writes / seconds:.0f}/с')
+            finally:
+                for alias in (PRIMARY, REPLICA):
+                    connections[alias].close()
+                    del connections.databases[alias]
+
+    def add_database(self, alias, name, options):
+        connections.databases[alias] = {
+            'ENGINE': 'yatube.db.sqlite3', 'NAME': name, 'OPTIONS': options,
+        }
+        connections.ensure_defaults(alias)
+
+    def bench(self, read_alias, options):
+        stop = threading.Event()
+        counts = []
+        writes = []
+        lock = threading.Lock()
+
+        def read():
+            count = 0
+            try:
+                while not stop.is_set():
+                    list(Post.objects.using(read_alias).for_feed()
+                         .order_by('-pub_date')[:10])
+                    count += 1
+            finally:
+                connections[read_alias].close()
+            with lock:
+                counts.append(count)
+
+        def write():
+            count = 0
+            try:
+                while not stop.is_set():
+                    with transaction.atomic(using=PRIMARY):
+                        with connections[PRIMARY].cursor() as cursor:
+                            cursor.execute(
+                                'INSERT INTO bench_writes (value) '
+                                'VALUES (%s)', [os.urandom(4096)])
+                    count += 1
+            finally:
+                connections[PRIMARY].close()
+            with lock:
+                writes.append(count)
+
+        threads = [threading.Thread(target=read)
+                   for _ in range(options['readers'])]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return sum(counts), sum(writes)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Post
+from posts.search import analysis
+
+
+class Command(BaseCommand):
+    help = ('Замеряет скорость анализатора поиска на корпусе постов, '
+            'сгенерированном mixer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000,
+                            help='Размер корпуса.')
+        parser.add_argument('--rounds', type=int, default=3,
+                            help='Сколько раз прогнать корпус.')
+
+    def handle(self, *args, **options):
+        try:
+            from mixer.backend.django import Mixer
+        except ImportError:
+            raise CommandError('Для бенчмарка нужен пакет mixer.')
+        mixer = Mixer(commit=False, locale='ru')
+        texts = [
+            post.text for post in mixer.cycle(options['posts']).blend(
+                Post, author=None, group=None, image=None,
+                text=mixer.faker.text,
+            )
+        ]
+        tokens = sum(len(analysis.tokenize(text)) for text in texts)
+        self.stdout.write(
+            f'Корпус: {len(texts)} постов, {tokens} слов.')
+
+        analysis.stem.cache_clear()
+        for round_number in range(1, options['rounds'] + 1):
+            started = time.perf_counter()
+            for text in texts:
+                analysis.analyze(text)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Проход {round_number}: {elapsed:.3f} с, '
+                f'{tokens / elapsed:,.0f} слов/с')
+
+        info = analysis.stem.cache_info()
+        self.stdout.write(
+            f'Кэш основ: {info.currsize} слов, попаданий {info.hits}, '
+            f'промахов {info.misses}.')
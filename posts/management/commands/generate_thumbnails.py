@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры картинок постов, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать все посты с картинками, '
+                 'а не только те, где миниатюры нет.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=thumbnails.workers() or 1,
+            help='Сколько потоков строят миниатюры.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(thumbnail='')
+        post_ids = list(posts.values_list('pk', flat=True))
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                names = list(pool.map(thumbnails.build, post_ids))
+        else:
+            names = [thumbnails.generate(pk) for pk in post_ids]
+        done = sum(name is not None for name in names)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр построено: {done} из {len(post_ids)}.'))
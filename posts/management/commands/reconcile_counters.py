@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счетчики постов и '
+            'пользователей и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        stale_posts = counters.stale_posts().count()
+        stale_users = counters.stale_users().count()
+        self.stdout.write(
+            f'Расхождений: постов {stale_posts}, '
+            f'пользователей {stale_users}.'
+        )
+        if options['dry_run']:
+            return
+        counters.recount_posts()
+        counters.recount_users()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
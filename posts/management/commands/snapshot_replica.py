@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.db.replicas import replicas, snapshot
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик '
+            'REPLICA_DATABASES.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help='Какие реплики обновить, по умолчанию все.')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replicas()
+        if not aliases:
+            raise CommandError('Реплики не настроены, см. DB_REPLICAS.')
+        source = settings.DATABASES['default']['NAME']
+        for alias in aliases:
+            if alias not in replicas():
+                raise CommandError(f'{alias} нет в REPLICA_DATABASES.')
+            target = settings.DATABASES[alias]['NAME']
+            started = time.perf_counter()
+            # Копия пишется рядом и подменяет реплику целиком, поэтому
+            # читатели видят либо старый снимок, либо новый.
+            snapshot(source, target + '.tmp')
+            os.replace(target + '.tmp', target)
+            self.stdout.write(
+                f'{alias}: {target} обновлена за '
+                f'{time.perf_counter() - started:.2f} с')
@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.template.defaultfilters import filesizeformat
+
+from posts import sweep
+
+
+class Command(BaseCommand):
+    help = ('Ищет в MEDIA_ROOT картинки и миниатюры, на которые нет '
+            'ссылок, и удаляет их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Удалить найденное. Без флага только отчёт.',
+        )
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help='Не трогать файлы, которые менялись за столько секунд.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько шардов обходить параллельно.',
+        )
+        parser.add_argument(
+            '--start-after', default='',
+            help='Продолжить с шарда, следующего за этим.',
+        )
+
+    def handle(self, *args, **options):
+        shards = sorted((shard for shard in sweep.shards()
+                         if shard.root > options['start_after']),
+                        key=lambda shard: shard.root)
+        total = sweep.Result()
+
+        def run(shard):
+            return sweep.sweep(shard, grace=options['grace'],
+                               dry_run=not options['delete'])
+
+        def run_in_thread(shard):
+            close_old_connections()
+            try:
+                return run(shard)
+            finally:
+                close_old_connections()
+
+        if options['workers'] > 1:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+            results = pool.map(run_in_thread, shards)
+        else:
+            pool, results = None, map(run, shards)
+        try:
+            for shard, result in zip(shards, results):
+                total.add(result)
+                if options['verbosity'] > 1 or result.orphans:
+                    self.stdout.write(
+                        f'{shard.root}: файлов {result.files}, '
+                        f'без ссылок {result.orphans} '
+                        f'({filesizeformat(result.orphan_bytes)})')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(
+            f'Всего файлов {total.files} '
+            f'({filesizeformat(total.bytes)}), без ссылок {total.orphans} '
+            f'({filesizeformat(total.orphan_bytes)}).')
+        if options['delete']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено файлов: {total.deleted}.'))
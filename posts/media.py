@@ -0,0 +1,75 @@
+"""Счётчики ссылок на файлы картинок постов.
+
+Сколько постов ссылается на файл, хранит StoredFile. Файлы без ссылок
+удаляет команда collect_media, а не сигнал, и только спустя grace-период:
+так не потеряется файл, который в этот момент загружают ещё раз.
+"""
+from datetime import timedelta
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import F
+from django.utils import timezone
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.images import ImageFile
+
+from .models import StoredFile
+from .storage import post_image_storage
+
+
+def acquire(name):
+    if not name:
+        return
+    updated = StoredFile.objects.filter(name=name).update(
+        refcount=F('refcount') + 1, updated=timezone.now())
+    if not updated:
+        _, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'refcount': 1})
+        if not created:
+            acquire(name)
+
+
+def release(name):
+    if name:
+        StoredFile.objects.filter(name=name, refcount__gt=0).update(
+            refcount=F('refcount') - 1, updated=timezone.now())
+
+
+def orphans(grace=timedelta(hours=1)):
+    return StoredFile.objects.filter(refcount=0,
+                                     updated__lt=timezone.now() - grace)
+
+
+def recently_written(name, grace):
+    try:
+        modified = post_image_storage.get_modified_time(name)
+    except (OSError, SuspiciousFileOperation):
+        return False
+    return modified > timezone.now() - grace
+
+
+def delete_file(name):
+    """Удаляет файл вместе с его миниатюрами sorl."""
+    try:
+        image = ImageFile(name, storage=post_image_storage)
+        thumbnail_default.kvstore.delete(image)
+        post_image_storage.delete(name)
+    except SuspiciousFileOperation:
+        # Имя вне MEDIA_ROOT (например, из фикстур): удалять нечего.
+        pass
+
+
+def collect(grace=timedelta(hours=1), dry_run=False):
+    """Удаляет файлы без ссылок. Возвращает их имена."""
+    collected = []
+    for name in list(orphans(grace).values_list('name', flat=True)):
+        if recently_written(name, grace):
+            continue
+        if dry_run:
+            collected.append(name)
+            continue
+        # Ссылка могла появиться после выборки.
+        deleted, _ = StoredFile.objects.filter(name=name, refcount=0).delete()
+        if deleted:
+            delete_file(name)
+            collected.append(name)
+    return collected
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search '
+        "USING fts5(body, post_id UNINDEXED, tokenize = 'unicode61')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, body, post_id) '
+        'SELECT id * 2, text, id FROM posts_post'
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, body, post_id) '
+        'SELECT id * 2 + 1, text, post_id FROM posts_comment '
+        'WHERE post_id IS NOT NULL'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+from posts.search.analysis import analyze
+
+BATCH_SIZE = 1000
+
+
+def documents(apps):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    for pk, text in Post.objects.values_list('pk', 'text').iterator():
+        yield pk * 2, text, pk
+    comments = (Comment.objects.filter(post__isnull=False)
+                .values_list('pk', 'text', 'post_id'))
+    for pk, text, post_id in comments.iterator():
+        yield pk * 2 + 1, text, post_id
+
+
+def analyzed_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_search USING fts5('
+        'body UNINDEXED, terms, post_id UNINDEXED, '
+        "tokenize = 'unicode61 remove_diacritics 0')"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        batch = []
+        for rowid, text, post_id in documents(apps):
+            batch.append((rowid, text, ' '.join(analyze(text)), post_id))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(
+                    'INSERT INTO posts_search (rowid, body, terms, post_id) '
+                    'VALUES (%s, %s, %s, %s)', batch)
+                batch = []
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, body, terms, post_id) '
+            'VALUES (%s, %s, %s, %s)', batch)
+
+
+def plain_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_search '
+        "USING fts5(body, post_id UNINDEXED, tokenize = 'unicode61')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, body, post_id) '
+        'SELECT id * 2, text, id FROM posts_post'
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, body, post_id) '
+        'SELECT id * 2 + 1, text, post_id FROM posts_comment '
+        'WHERE post_id IS NOT NULL'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(analyzed_index, plain_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-17 20:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.http import int_to_base36
+
+
+def fill_paths(apps, schema_editor):
+    # До веток все комментарии были корневыми: путь состоит из своего id.
+    Comment = apps.get_model('posts', 'Comment')
+    comments = []
+    for pk in Comment.objects.values_list('pk', flat=True).iterator():
+        comments.append(Comment(pk=pk, path=int_to_base36(pk).zfill(8)))
+        if len(comments) >= 500:
+            Comment.objects.bulk_update(comments, ['path'])
+            comments = []
+    Comment.objects.bulk_update(comments, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_view_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='posts_comment_thread_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.6 on 2026-10-17 20:02
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def follow_count(Follow, field):
+    counts = (Follow.objects.filter(**{field: OuterRef('user_id')})
+              .order_by().values(field).annotate(count=Count('pk'))
+              .values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    # Без уникальности get_or_create мог создать подписку дважды.
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    duplicates = (Follow.objects.order_by().values('user', 'author')
+                  .annotate(first=Min('pk'), count=Count('pk'))
+                  .filter(count__gt=1))
+    users = set()
+    for row in duplicates.iterator():
+        Follow.objects.filter(user=row['user'], author=row['author']) \
+            .exclude(pk=row['first']).delete()
+        users.update((row['user'], row['author']))
+    UserStats.objects.filter(user__in=users).update(
+        followers_count=follow_count(Follow, 'author'),
+        following_count=follow_count(Follow, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
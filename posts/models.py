@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.http import int_to_base36
+from sorl.thumbnail.default import storage as thumbnail_storage
+
+from .storage import post_image_storage
 
 User = get_user_model()
 
@@ -18,13 +22,29 @@ class Group(models.Model):
     
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        return (self.select_related('author', 'group')
+                .prefetch_related('variants'))
+
+
 class Post(models.Model):
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date_idx'),
+        ]
+
+    objects = PostQuerySet.as_manager()
 
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Напишите текст поста')
     pub_date = models.DateTimeField('date published', auto_now_add=True)
+    updated = models.DateTimeField('date updated', auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='posts',
                                blank=True, null=True)
@@ -34,17 +54,99 @@ class Post(models.Model):
                               related_name='posts',
                               blank=True, null=True)
     image = models.ImageField(upload_to='posts/', verbose_name='Картинка',
-                              help_text='Добавьте картинку', blank=True, null=True)
+                              help_text='Добавьте картинку', blank=True, null=True,
+                              storage=post_image_storage)
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
     likes = models.ManyToManyField(User, related_name='blog_posts')
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.text[:15]
 
     def total_likes(self):
-        return self.likes.count()
+        return self.like_count
+
+    @property
+    def thumbnail_url(self):
+        return thumbnail_storage.url(self.thumbnail)
+
+
+class ImageVariant(models.Model):
+    class Meta:
+        ordering = ['width']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'width', 'format'],
+                                    name='unique_image_variant'),
+        ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='variants')
+    name = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def url(self):
+        return thumbnail_storage.url(self.name)
+
+    @property
+    def mime_type(self):
+        return 'image/' + self.format.lower()
+
+
+class StoredFile(models.Model):
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+# Ветка комментариев хранится материализованным путём: base36-id всех
+# предков и самого комментария, по PATH_STEP символов на уровень. Ветка
+# целиком читается одним запросом по диапазону путей, в порядке обхода.
+PATH_STEP = 8
+MAX_COMMENT_DEPTH = 255 // PATH_STEP - 1
+
+
+def path_segment(pk):
+    return int_to_base36(pk).zfill(PATH_STEP)
+
+
+def path_ids(path):
+    return [int(path[start:start + PATH_STEP], 36)
+            for start in range(0, len(path), PATH_STEP)]
+
+
+class CommentManager(models.Manager):
+    # Менеджер, а не QuerySet: списки комментариев остаются обычными
+    # QuerySet, как их ждут шаблоны и тесты.
+    def subtree(self, path, max_depth=None):
+        """Комментарий с путём path и все ответы на него."""
+        queryset = self.filter(path__gte=path, path__lt=path + '~')
+        if max_depth is not None:
+            queryset = queryset.filter(depth__lte=max_depth)
+        return queryset.order_by('path')
 
 
 class Comment(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'path'],
+                         name='posts_comment_thread_idx'),
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
+    objects = CommentManager()
+
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -57,6 +159,12 @@ class Comment(models.Model):
         related_name='comments',
         blank=True, null=True
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True, null=True
+    )
     text = models.TextField(
         verbose_name='Текст комментария',
         help_text='Напишите текст комментария',
@@ -64,12 +172,64 @@ class Comment(models.Model):
     created = models.DateTimeField(
         'Дата публикации', auto_now_add=True
     )
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.parent_id is not None:
+            if self.parent.depth >= MAX_COMMENT_DEPTH:
+                # Глубже путь не помещается: отвечаем соседом родителя.
+                self.parent = self.parent.parent
+            self.post_id = self.parent.post_id
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if not self.path:
+            prefix = self.parent.path if self.parent_id is not None else ''
+            self.path = prefix + path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Follow(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='follower', blank=True, null=True)
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='following', blank=True, null=True)
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True, related_name='stats')
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
+
+class TimelineEntry(models.Model):
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='timeline_entries')
+    pub_date = models.DateTimeField('date published')
@@ -0,0 +1,252 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import PATH_STEP, Comment
+
+PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPaginator:
+    """Keyset-пагинатор: страница выбирается условием по (pub_date, id)
+    вместо OFFSET, поэтому глубокие страницы не медленнее первой."""
+
+    cursor_based = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 count_timeout=60):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.count_timeout = count_timeout
+
+    @property
+    def fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for field in self.fields:
+            # Строки values() — словари, их тоже можно листать.
+            value = obj[field] if isinstance(obj, dict) \
+                else getattr(obj, field)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return NEXT, None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError, binascii.Error):
+            return NEXT, None
+        if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) \
+                or len(values) != len(self.fields):
+            return NEXT, None
+        # Курсор приходит от клиента: значение, которое не подходит полю
+        # (31 февраля, id из букв), открывает первую страницу, а не 500.
+        meta = self.object_list.model._meta
+        try:
+            values = [meta.get_field(name).to_python(value)
+                      for name, value in zip(self.fields, values)]
+        except (ValidationError, ValueError, TypeError):
+            return NEXT, None
+        if None in values:
+            return NEXT, None
+        return direction, values
+
+    def _seek(self, values, direction):
+        condition = Q()
+        equal = {}
+        for field, ordering, value in zip(self.fields, self.ordering, values):
+            descending = ordering.startswith('-')
+            if direction == PREVIOUS:
+                descending = not descending
+            lookup = '__lt' if descending else '__gt'
+            condition |= Q(**equal, **{field + lookup: value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else '-' + field
+                for field in self.ordering]
+
+    def seek(self, cursor=None):
+        """Направление и запрос строк после курсора, без LIMIT."""
+        direction, values = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, direction))
+        if direction == PREVIOUS:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        return direction, values, queryset
+
+    def page(self, cursor=None):
+        direction, values, queryset = self.seek(cursor)
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            return CursorPage(rows, self, has_next=True,
+                              has_previous=has_more)
+        return CursorPage(rows, self, has_next=has_more,
+                          has_previous=values is not None)
+
+    @cached_property
+    def count(self):
+        """Приблизительное число объектов: COUNT(*) кэшируется на
+        count_timeout секунд и не выполняется, пока не понадобится."""
+        query = str(self.object_list.order_by().query)
+        key = 'cursor_count:' + hashlib.md5(query.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, self.count_timeout)
+        return count
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __repr__(self):
+        return '<CursorPage of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0],
+                                                PREVIOUS)
+
+
+def max_comment_depth():
+    return getattr(settings, 'COMMENTS_MAX_DEPTH', 3)
+
+
+def comment_paginator(comments, per_page=COMMENTS_PER_PAGE):
+    """Корневые комментарии поста от старых к новым, курсор по
+    (created, id)."""
+    return CursorPaginator(
+        comments.filter(parent__isnull=True).select_related('author'),
+        per_page, ordering=('created', 'id'))
+
+
+def replies_per_thread():
+    return getattr(settings, 'COMMENTS_REPLIES_PER_THREAD', 20)
+
+
+def thread_replies(comment, cursor=None, max_depth=None, limit=None):
+    """Ответы на comment в порядке обхода, после пути cursor, не больше
+    limit; второе значение — курсор продолжения или None."""
+    limit = limit or replies_per_thread()
+    queryset = Comment.objects.filter(post_id=comment.post_id,
+                                      path__gt=comment.path,
+                                      path__lt=comment.path + '~')
+    if cursor:
+        queryset = queryset.filter(path__gt=cursor)
+    if max_depth is not None:
+        queryset = queryset.filter(depth__lte=max_depth)
+    rows = list(queryset.select_related('author')
+                .order_by('path')[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].path
+    return rows, None
+
+
+def _range_replies(post, roots, replies):
+    # Ветки соседних корней лежат в одном диапазоне путей и читаются
+    # одним запросом.
+    if not roots:
+        return
+    rows = (post.comments.select_related('author')
+            .filter(path__gt=roots[0].path, path__lt=roots[-1].path + '~',
+                    depth__gt=0, depth__lte=max_comment_depth())
+            .order_by('path'))
+    for reply in rows:
+        replies.setdefault(reply.path[:PATH_STEP], []).append(reply)
+
+
+def comment_threads(post, roots):
+    """Корни страницы и ответы на них до max_comment_depth() в порядке
+    обхода дерева, не больше replies_per_thread() на корень.
+
+    Небольшие ветки читаются одним запросом на диапазон путей, большая
+    ветка — своим запросом с LIMIT, а у её последнего ответа появляется
+    more_replies: (id корня, курсор) для кнопки «Показать ещё ответы».
+    """
+    roots = list(roots)
+    limit = replies_per_thread()
+    replies = {}
+    run = []
+    for root in sorted(roots, key=lambda root: root.path):
+        if root.reply_count <= limit:
+            if root.reply_count:
+                run.append(root)
+            continue
+        _range_replies(post, run, replies)
+        run = []
+        rows, cursor = thread_replies(root, max_depth=max_comment_depth(),
+                                      limit=limit)
+        if cursor:
+            rows[-1].more_replies = (root.pk, cursor)
+        replies[root.path] = rows
+    _range_replies(post, run, replies)
+    thread = []
+    for root in roots:
+        thread.append(root)
+        thread.extend(replies.get(root.path, []))
+    return thread
+
+
+def paginate(request, object_list, per_page=PER_PAGE):
+    cursor = request.GET.get('cursor')
+    mode = getattr(settings, 'POSTS_PAGINATION', 'page')
+    if cursor is not None or mode == 'cursor':
+        return CursorPaginator(object_list, per_page).page(cursor)
+    paginator = Paginator(object_list, per_page)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1 @@
+from .backends import get_backend  # noqa
@@ -0,0 +1,149 @@
+"""Анализ русского текста для поискового индекса.
+
+Текст нормализуется (NFKC, casefold, ё -> е), режется на слова, из
+него убираются стоп-слова, а оставшиеся слова сводятся к основе
+стеммером Snowball для русского языка. Основы кэшируются, поэтому
+переиндексация большого числа постов почти не тратит время на стемминг.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+WORD_RE = re.compile(r'\w+')
+
+VOWELS = 'аеиоуыэюя'
+
+STOPWORDS = frozenset('''
+и в во не что он на я с со как а то все она так его но да ты к у же
+вы за бы по только ее мне было вот от меня еще нет о из ему теперь
+когда даже ну вдруг ли если уже или ни быть был него до вас нибудь
+опять уж вам ведь там потом себя ничего ей может они тут где есть
+надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже
+себе под будет ж тогда кто этот того потому этого какой совсем ним
+здесь этом один почти мой тем чтобы нее сейчас были куда зачем всех
+никогда можно при наконец два об другой хоть после над больше тот
+через эти нас про всего них какая много разве три эту моя впрочем
+хорошо свою этой перед иногда лучше чуть том нельзя такой им более
+всегда конечно всю между это
+'''.split())
+
+
+def _table(*groups):
+    """Окончания вместе с флагом «должно идти после а/я», длинные
+    первыми: так поиск сразу находит самое длинное окончание."""
+    endings = []
+    for needs_a_ya, words in groups:
+        endings.extend((ending, needs_a_ya) for ending in words.split())
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _table(
+    (True, 'в вши вшись'),
+    (False, 'ив ивши ившись ыв ывши ывшись'),
+)
+ADJECTIVE = _table(
+    (False, 'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому '
+            'их ых ую юю ая яя ою ею'),
+)
+PARTICIPLE = _table(
+    (True, 'ем нн вш ющ щ'),
+    (False, 'ивш ывш ующ'),
+)
+REFLEXIVE = _table((False, 'ся сь'))
+VERB = _table(
+    (True, 'ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно'),
+    (False, 'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило '
+            'ыло ено ят ует уют ит ыт ены ить ыть ишь ую ю'),
+)
+NOUN = _table(
+    (False, 'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям '
+            'ием ем ам ом о у ах иях ях ы ь ию ью ю ия ья я'),
+)
+SUPERLATIVE = _table((False, 'ейш ейше'))
+DERIVATIONAL = _table((False, 'ост ость'))
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _remove(word, start, table):
+    """Отрезает самое длинное окончание из table, лежащее в word[start:].
+    Возвращает None, если подходящего окончания нет."""
+    for ending, needs_a_ya in table:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if needs_a_ya and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return None
+        return word[:cut]
+    return None
+
+
+def _step1(word, rv):
+    """Деепричастие, иначе возвратная частица и окончание
+    прилагательного (с причастием), глагола или существительного."""
+    result = _remove(word, rv, PERFECTIVE_GERUND)
+    if result is not None:
+        return result
+    result = _remove(word, rv, REFLEXIVE) or word
+    adjective = _remove(result, rv, ADJECTIVE)
+    if adjective is not None:
+        participle = _remove(adjective, rv, PARTICIPLE)
+        return adjective if participle is None else participle
+    verb = _remove(result, rv, VERB)
+    if verb is None:
+        verb = _remove(result, rv, NOUN)
+    return result if verb is None else verb
+
+
+@lru_cache(maxsize=200000)
+def stem(word):
+    rv, r2 = _regions(word)
+    result = _step1(word, rv)
+
+    if result.endswith('и') and len(result) - 1 >= rv:
+        result = result[:-1]
+
+    derivational = _remove(result, r2, DERIVATIONAL)
+    if derivational is not None:
+        result = derivational
+
+    if result.endswith('нн') and len(result) - 2 >= rv:
+        result = result[:-1]
+    else:
+        superlative = _remove(result, rv, SUPERLATIVE)
+        if superlative is not None:
+            result = superlative
+            if result.endswith('нн') and len(result) - 2 >= rv:
+                result = result[:-1]
+        elif result.endswith('ь') and len(result) - 1 >= rv:
+            result = result[:-1]
+    return result
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return text.replace('ё', 'е')
+
+
+def tokenize(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def analyze(text):
+    return [stem(token) for token in tokenize(text)
+            if token not in STOPWORDS]
@@ -0,0 +1,256 @@
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from posts.models import Comment, Post
+
+from .analysis import WORD_RE, analyze, normalize, stem, tokenize
+
+TABLE = 'posts_search'
+SNIPPET_WORDS = 24
+BATCH_SIZE = 1000
+POST = 0
+COMMENT = 1
+
+_backend = None
+
+
+def max_candidates():
+    return getattr(settings, 'POSTS_SEARCH_MAX_CANDIDATES', 1000)
+
+
+def get_backend():
+    global _backend
+    path = getattr(settings, 'POSTS_SEARCH_BACKEND',
+                   'posts.search.backends.SQLiteFTSBackend')
+    if _backend is None or _backend.path != path:
+        _backend = import_string(path)()
+        _backend.path = path
+    return _backend
+
+
+def make_snippet(text, stems, size=SNIPPET_WORDS):
+    """Фрагмент текста вокруг первого совпадения; слова с теми же
+    основами, что и в запросе, обернуты в <mark>."""
+    words = list(WORD_RE.finditer(text))
+    if not words:
+        return escape(text)
+    hits = {i for i, word in enumerate(words)
+            if stem(normalize(word.group())) in stems}
+    start = max(0, min(hits, default=0) - size // 4)
+    end = min(len(words), start + size)
+    pieces = ['…' if start else '']
+    position = words[start].start()
+    for i in range(start, end):
+        word = words[i]
+        pieces.append(escape(text[position:word.start()]))
+        if i in hits:
+            pieces.append('<mark>%s</mark>' % escape(word.group()))
+        else:
+            pieces.append(escape(word.group()))
+        position = word.end()
+    pieces.append('…' if end < len(words) else escape(text[position:]))
+    return mark_safe(''.join(pieces))
+
+
+class SearchResults:
+    """Ленивый список найденных постов для Paginator: считает и
+    загружает только запрошенный срез."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        if stop <= start:
+            return []
+        return self.backend.fetch(self.query, start, stop - start)
+
+
+class BaseSearchBackend:
+    def index_post(self, post):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def remove_comment(self, comment_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def fetch(self, query, offset, limit):
+        raise NotImplementedError
+
+
+class DatabaseBackend(BaseSearchBackend):
+    """Поиск без индекса через icontains, для СУБД без FTS."""
+
+    def queryset(self, query):
+        condition = Q()
+        for token in set(tokenize(query)):
+            condition &= (Q(text__icontains=token)
+                          | Q(comments__text__icontains=token))
+        if not condition:
+            return Post.objects.none()
+        ids = Post.objects.filter(condition).values('pk')
+        return Post.objects.for_feed().filter(pk__in=ids)
+
+    def count(self, query):
+        return self.queryset(query).count()
+
+    def fetch(self, query, offset, limit):
+        stems = set(analyze(query))
+        posts = list(self.queryset(query)[offset:offset + limit])
+        for post in posts:
+            post.search_snippet = make_snippet(post.text, stems)
+        return posts
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Инвертированный индекс на SQLite FTS5.
+
+    rowid записи индекса кодирует объект: id * 2 для поста и
+    id * 2 + 1 для комментария, поэтому обновление и удаление идут по
+    первичному ключу, без просмотра таблицы. Индексируются основы слов
+    из analysis.analyze(), исходный текст хранится для фрагментов.
+    """
+
+    @staticmethod
+    def rowid(kind, object_id):
+        return object_id * 2 + kind
+
+    @staticmethod
+    def reader():
+        # Запись в индекс идёт в default, поиск — туда же, куда и чтение
+        # постов, то есть в реплику внутри read_only.
+        return connections[router.db_for_read(Post)]
+
+    def match(self, query):
+        return ' '.join('"%s"' % term for term in set(analyze(query)))
+
+    def _insert(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, body, terms, post_id) '
+            'VALUES (%s, %s, %s, %s)',
+            [(rowid, body, ' '.join(analyze(body)), post_id)
+             for rowid, body, post_id in rows],
+        )
+
+    def _replace(self, kind, object_id, post_id, body):
+        rowid = self.rowid(kind, object_id)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+            self._insert(cursor, [(rowid, body, post_id)])
+
+    def _delete(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                           [self.rowid(kind, object_id)])
+
+    def index_post(self, post):
+        self._replace(POST, post.pk, post.pk, post.text)
+
+    def index_comment(self, comment):
+        if comment.post_id is None:
+            self.remove_comment(comment.pk)
+        else:
+            self._replace(COMMENT, comment.pk, comment.post_id, comment.text)
+
+    def remove_post(self, post_id):
+        self._delete(POST, post_id)
+
+    def remove_comment(self, comment_id):
+        self._delete(COMMENT, comment_id)
+
+    def _documents(self):
+        for pk, text in Post.objects.values_list('pk', 'text').iterator():
+            yield self.rowid(POST, pk), text, pk
+        comments = (Comment.objects.filter(post__isnull=False)
+                    .values_list('pk', 'text', 'post_id'))
+        for pk, text, post_id in comments.iterator():
+            yield self.rowid(COMMENT, pk), text, post_id
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            batch = []
+            for document in self._documents():
+                batch.append(document)
+                if len(batch) >= BATCH_SIZE:
+                    self._insert(cursor, batch)
+                    batch = []
+            self._insert(cursor, batch)
+
+    def _candidates(self):
+        # Ранжируются только самые новые совпадения: FTS5 идёт по rowid
+        # в обратном порядке и останавливается на LIMIT, а rank считает
+        # лишь для прочитанных строк. Поэтому поиск частого слова не
+        # дольше поиска редкого.
+        return (f'SELECT post_id, body, rank FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s')
+
+    def count(self, query):
+        """Число найденных постов, не больше max_candidates()."""
+        match = self.match(query)
+        if not match:
+            return 0
+        with self.reader().cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT post_id) FROM ({self._candidates()})',
+                [match, max_candidates()],
+            )
+            return cursor.fetchone()[0]
+
+    def fetch(self, query, offset, limit):
+        match = self.match(query)
+        if not match:
+            return []
+        with self.reader().cursor() as cursor:
+            # С MIN() SQLite берёт body из той же строки, то есть текст
+            # лучшего совпадения поста для фрагмента.
+            cursor.execute(
+                f'SELECT post_id, body, MIN(rank) AS best '
+                f'FROM ({self._candidates()}) '
+                'GROUP BY post_id ORDER BY best LIMIT %s OFFSET %s',
+                [match, max_candidates(), limit, offset],
+            )
+            rows = cursor.fetchall()
+        ids = [post_id for post_id, _, _ in rows]
+        bodies = {post_id: body for post_id, body, _ in rows}
+        stems = set(analyze(query))
+        posts = Post.objects.for_feed().in_bulk(ids)
+        results = []
+        for post_id in ids:
+            post = posts.get(post_id)
+            if post is not None:
+                post.search_snippet = make_snippet(
+                    bodies.get(post_id, post.text), stems)
+                results.append(post)
+        return results
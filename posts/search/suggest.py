@@ -0,0 +1,265 @@
+"""Подсказки для поиска по префиксу без обращения к базе.
+
+Индекс — отсортированный массив ключей, префикс ищется двумя bisect.
+Он строится из базы в фоне при первом запросе к процессу (при
+SUGGEST_WARM_UP = False — при первой подсказке), потом обновляется
+сигналами сохранения Post/Group/User и раз в SUGGEST_REBUILD_INTERVAL
+секунд перестраивается в фоне, чтобы подтянуть изменения из других
+процессов.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+from .analysis import STOPWORDS, normalize, tokenize
+
+USER = 'user'
+GROUP = 'group'
+TERM = 'term'
+
+MIN_TERM_LENGTH = 3
+MAX_CANDIDATES = 2000
+PENDING_SIZE = 1000
+
+
+def _terms(text):
+    return [token for token in tokenize(text)
+            if len(token) >= MIN_TERM_LENGTH and token not in STOPWORDS
+            and not token.isdigit()]
+
+
+class PrefixIndex:
+    """Отсортированные ключи и записи.
+
+    Новые ключи вставляются в небольшой отсортированный список и
+    сливаются с основным одним проходом, когда их набирается
+    PENDING_SIZE. Оба списка заменяются целиком парой (ключи, записи),
+    поэтому поиск читает их без блокировки.
+    """
+
+    def __init__(self):
+        self._sorted = ([], [])
+        self._pending = ([], [])
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sorted[0]) + len(self._pending[0])
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Индекс из пар (ключ, запись) одной сортировкой, без вставок
+        по одной."""
+        unique = {}
+        for key, entry in pairs:
+            key = normalize(key)
+            unique[key, entry[:2]] = key, entry
+        index = cls()
+        items = sorted(unique.values(), key=lambda item: item[0])
+        index._sorted = ([key for key, _ in items],
+                         [entry for _, entry in items])
+        return index
+
+    @staticmethod
+    def _merge(main, pending):
+        """Сливает pending в main: между вставками списки копируются
+        срезами."""
+        keys, entries = main
+        merged_keys, merged_entries = [], []
+        start = 0
+        for key, entry in zip(*pending):
+            position = bisect.bisect_right(keys, key, lo=start)
+            merged_keys += keys[start:position]
+            merged_entries += entries[start:position]
+            merged_keys.append(key)
+            merged_entries.append(entry)
+            start = position
+        merged_keys += keys[start:]
+        merged_entries += entries[start:]
+        return merged_keys, merged_entries
+
+    @staticmethod
+    def _find(keys, entries, key, entry):
+        position = bisect.bisect_left(keys, key)
+        while position < len(keys) and keys[position] == key:
+            if entries[position][:2] == entry[:2]:
+                return position
+            position += 1
+        return None
+
+    def items(self):
+        return zip(*self._merge(self._sorted, self._pending))
+
+    def add(self, key, entry):
+        self.add_many([(key, entry)])
+
+    def add_many(self, pairs):
+        with self._lock:
+            keys, entries = self._sorted
+            pending_keys, pending_entries = map(list, self._pending)
+            for key, entry in pairs:
+                key = normalize(key)
+                position = self._find(keys, entries, key, entry)
+                if position is not None:
+                    entries[position] = entry
+                    continue
+                position = self._find(pending_keys, pending_entries, key,
+                                      entry)
+                if position is not None:
+                    pending_entries[position] = entry
+                    continue
+                position = bisect.bisect_right(pending_keys, key)
+                pending_keys.insert(position, key)
+                pending_entries.insert(position, entry)
+            pending = pending_keys, pending_entries
+            if len(pending_keys) >= PENDING_SIZE:
+                self._sorted = self._merge(self._sorted, pending)
+                pending = [], []
+            self._pending = pending
+
+    def remove(self, kind, value):
+        with self._lock:
+            for name in ('_sorted', '_pending'):
+                keep = [(key, entry)
+                        for key, entry in zip(*getattr(self, name))
+                        if entry[:2] != (kind, value)]
+                setattr(self, name, ([key for key, _ in keep],
+                                     [entry for _, entry in keep]))
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        found = {}
+        for keys, entries in (self._sorted, self._pending):
+            start = bisect.bisect_left(keys, prefix)
+            stop = bisect.bisect_left(keys, prefix + '\uffff', lo=start)
+            stop = min(stop, start + MAX_CANDIDATES)
+            for entry in entries[start:stop]:
+                # Слова, которых не осталось в постах, лежат в индексе
+                # с нулевой частотой до следующей сборки.
+                if entry[3]:
+                    found.setdefault(entry[:2], entry)
+        return heapq.nlargest(limit, found.values(),
+                              key=lambda entry: entry[3])
+
+
+class Suggester:
+    def __init__(self):
+        self.index = None
+        self.term_counts = Counter()
+        self.built_at = 0
+        self._rebuilding = threading.Lock()
+        self._terms_lock = threading.Lock()
+
+    @property
+    def rebuild_interval(self):
+        return getattr(settings, 'SUGGEST_REBUILD_INTERVAL', 600)
+
+    def build(self):
+        pairs = []
+        term_counts = Counter()
+        for username in User.objects.values_list('username', flat=True):
+            pairs.append((username, self.user_entry(username)))
+        for slug, title in Group.objects.values_list('slug', 'title'):
+            entry = self.group_entry(slug, title)
+            pairs.append((slug, entry))
+            pairs.append((title, entry))
+        for text in Post.objects.values_list('text', flat=True).iterator():
+            term_counts.update(_terms(text))
+        for term, count in term_counts.items():
+            pairs.append((term, (TERM, term, term, count)))
+        self.index = PrefixIndex.from_pairs(pairs)
+        self.term_counts = term_counts
+        self.built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        if not self._rebuilding.acquire(blocking=False):
+            return
+
+        def rebuild():
+            try:
+                self.build()
+            finally:
+                connection.close()
+                self._rebuilding.release()
+
+        threading.Thread(target=rebuild, daemon=True).start()
+
+    def warm_up(self, **kwargs):
+        """Обработчик request_started: индекс строится в фоне, и первая
+        подсказка его не ждёт."""
+        if not getattr(settings, 'SUGGEST_WARM_UP', True):
+            return
+        if self.index is None:
+            self._rebuild_in_background()
+
+    def suggest(self, prefix, limit=10):
+        if self.index is None:
+            if self._rebuilding.locked():
+                return []
+            self.build()
+        elif time.monotonic() - self.built_at > self.rebuild_interval:
+            self._rebuild_in_background()
+        return [
+            {'type': entry[0], 'value': entry[1], 'label': entry[2],
+             'url': self.url(entry)}
+            for entry in self.index.search(prefix, limit)
+        ]
+
+    @staticmethod
+    def user_entry(username):
+        return (USER, username, '@' + username, float('inf'))
+
+    @staticmethod
+    def group_entry(slug, title):
+        return (GROUP, slug, '#' + title, float('inf'))
+
+    @staticmethod
+    def url(entry):
+        kind, value = entry[:2]
+        if kind == USER:
+            return reverse('profile', kwargs={'username': value})
+        if kind == GROUP:
+            return reverse('group', kwargs={'slug': value})
+        return reverse('search_results') + '?q=' + value
+
+    def add_user(self, user):
+        if self.index is not None:
+            self.index.add(user.username, self.user_entry(user.username))
+
+    def add_group(self, group):
+        if self.index is not None:
+            self.index.remove(GROUP, group.slug)
+            entry = self.group_entry(group.slug, group.title)
+            self.index.add_many([(group.slug, entry), (group.title, entry)])
+
+    def update_terms(self, old_text, new_text):
+        """Частоты слов после создания (old_text пустой), правки или
+        удаления (new_text пустой) поста."""
+        index = self.index
+        if index is None:
+            return
+        delta = Counter(_terms(new_text))
+        delta.subtract(_terms(old_text))
+        pairs = []
+        with self._terms_lock:
+            for term, change in delta.items():
+                if not change:
+                    continue
+                count = max(self.term_counts[term] + change, 0)
+                self.term_counts[term] = count
+                pairs.append((term, (TERM, term, term, count)))
+        index.add_many(pairs)
+
+    def remove(self, kind, value):
+        if self.index is not None:
+            self.index.remove(kind, value)
+
+
+suggester = Suggester()
@@ -0,0 +1,129 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, media, timeline
+from .models import (Comment, Follow, Group, Post, User, UserStats,
+                     path_ids)
+from .search import get_backend
+from .search.suggest import GROUP, USER, suggester
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+    suggester.add_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    suggester.remove(USER, instance.username)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    suggester.add_group(instance)
+    if not created and not raw:
+        feed_cache.bump_group(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    suggester.remove(GROUP, instance.slug)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        previous = (Post.objects.filter(pk=instance.pk)
+                    .values_list('group_id', 'image', 'text').first())
+        if previous is not None:
+            (instance._previous_group_id,
+             instance._previous_image,
+             instance._previous_text) = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    get_backend().index_post(instance)
+    suggester.update_terms(instance.__dict__.pop('_previous_text', ''),
+                           instance.text)
+    if not raw:
+        previous_image = instance.__dict__.pop('_previous_image', None)
+        if instance.image.name != previous_image:
+            media.acquire(instance.image.name)
+            media.release(previous_image)
+    feed_cache.bump(feed_cache.post_scopes(
+        instance.author_id,
+        {instance.group_id, instance.__dict__.pop('_previous_group_id', None)},
+    ))
+    if created and not raw:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    get_backend().remove_post(instance.pk)
+    suggester.update_terms(instance.text, '')
+    media.release(instance.image.name)
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    feed_cache.bump(feed_cache.post_scopes(instance.author_id,
+                                           [instance.group_id]))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        feed_cache.bump([feed_cache.scope(feed_cache.FOLLOWER,
+                                          instance.user_id)])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    timeline.purge(instance.user_id, instance.author_id)
+    timeline.schedule_rebalance(instance.author_id)
+    feed_cache.bump([feed_cache.scope(feed_cache.FOLLOWER, instance.user_id)])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    get_backend().index_comment(instance)
+    if created and not raw:
+        counters.bump_post(instance.post_id, 'comment_count', 1)
+        if instance.parent_id is not None:
+            counters.bump_replies(path_ids(instance.parent.path), 1)
+        feed_cache.bump_posts([instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    get_backend().remove_comment(instance.pk)
+    counters.bump_post(instance.post_id, 'comment_count', -1)
+    # При каскадном удалении ветки каждый ответ уменьшает счётчики своих
+    # предков, уже удалённые просто не найдутся.
+    counters.bump_replies(path_ids(instance.path)[:-1], -1)
+    feed_cache.bump_posts([instance.post_id])
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_likes = list(
+            instance.blog_posts.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        post_ids = [instance.pk]
+    elif action == 'post_clear':
+        post_ids = instance.__dict__.pop('_cleared_likes', [])
+    else:
+        post_ids = pk_set
+    counters.recount_likes(post_ids)
+    feed_cache.bump_posts(post_ids)
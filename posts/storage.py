@@ -0,0 +1,57 @@
+"""Хранилище картинок постов, адресуемое по содержимому.
+
+Файл хешируется (SHA-256) прямо при записи во временный файл и кладётся
+под именем posts/ab/cd/<хеш>.<расширение>. Одинаковые картинки хранятся
+один раз, и миниатюры sorl, которые строятся по имени исходника, у них
+тоже общие. Ссылки на файлы считает posts.media.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменится хешем в _save, а одинаковые файлы
+        # должны получать одно и то же имя, без суффиксов.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(dir=self.location,
+                                             prefix='.upload-')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = '/'.join(filter(None, [
+                directory, hexdigest[:2], hexdigest[2:4],
+                hexdigest + extension,
+            ]))
+            path = self.path(name)
+            if os.path.exists(path):
+                # Свежее время изменения не даст collect_media удалить
+                # файл, на который вот-вот появится ссылка.
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                file_move_safe(temporary, path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
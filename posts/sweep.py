@@ -0,0 +1,157 @@
+"""Поиск и удаление осиротевших файлов в MEDIA_ROOT.
+
+Дерево делится на шарды: подкаталоги cache/ (миниатюры sorl) и posts/
+(картинки постов), плюс файлы прямо в posts/ от старых загрузок. Шарды
+обходятся os.scandir без полного списка файлов, по BATCH_SIZE имён за
+раз: для каждой пачки одним запросом проверяются ссылки из базы и
+хранилища ключей sorl. Поэтому память не растёт с размером дерева,
+а шарды можно обрабатывать параллельно.
+"""
+import os
+import time
+from collections import namedtuple
+
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import media
+from .models import ImageVariant, Post, StoredFile
+from .storage import post_image_storage
+
+BATCH_SIZE = 500
+
+THUMBNAILS = 'thumbnails'
+IMAGES = 'images'
+
+Shard = namedtuple('Shard', 'kind root recursive')
+
+
+class Result:
+    def __init__(self):
+        self.files = self.bytes = 0
+        self.orphans = self.orphan_bytes = 0
+        self.deleted = 0
+
+    def add(self, other):
+        for field in vars(self):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+
+def _storage(kind):
+    return thumbnail_default.storage if kind == THUMBNAILS \
+        else post_image_storage
+
+
+def _subdirectories(path):
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield entry.name
+    except FileNotFoundError:
+        return
+
+
+def shards():
+    thumbnails_root = thumbnail_settings.THUMBNAIL_PREFIX.strip('/')
+    for name in _subdirectories(_storage(THUMBNAILS).path(thumbnails_root)):
+        yield Shard(THUMBNAILS, thumbnails_root + '/' + name, True)
+    images_root = Post._meta.get_field('image').upload_to.strip('/')
+    yield Shard(IMAGES, images_root, False)
+    for name in _subdirectories(_storage(IMAGES).path(images_root)):
+        yield Shard(IMAGES, images_root + '/' + name, True)
+
+
+def _walk(storage, root, recursive):
+    """(имя, размер, mtime) файлов шарда, без загрузки всего списка."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(storage.path(directory))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = directory + '/' + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(name)
+                elif not entry.name.startswith('.'):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def _batches(items):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _in_kvstore(names):
+    storage = _storage(THUMBNAILS)
+    keys = {add_prefix(ImageFile(name, storage=storage).key): name
+            for name in names}
+    kvstore = thumbnail_default.kvstore
+    if isinstance(kvstore, KVStore):
+        found = KVStoreModel.objects.filter(key__in=list(keys)) \
+            .values_list('key', flat=True)
+    else:
+        found = [key for key in keys if kvstore._get_raw(key) is not None]
+    return {keys[key] for key in found}
+
+
+def referenced(kind, names):
+    if kind == THUMBNAILS:
+        alive = set(Post.objects.filter(thumbnail__in=names)
+                    .values_list('thumbnail', flat=True))
+        alive.update(ImageVariant.objects.filter(name__in=names)
+                     .values_list('name', flat=True))
+        alive.update(_in_kvstore(set(names) - alive))
+        return alive
+    alive = set(Post.objects.filter(image__in=names)
+                .values_list('image', flat=True))
+    alive.update(StoredFile.objects.filter(name__in=names, refcount__gt=0)
+                 .values_list('name', flat=True))
+    return alive
+
+
+def _delete(kind, name):
+    if kind == IMAGES:
+        StoredFile.objects.filter(name=name, refcount=0).delete()
+        media.delete_file(name)
+    else:
+        _storage(kind).delete(name)
+
+
+def sweep(shard, grace=3600, dry_run=True):
+    result = Result()
+    storage = _storage(shard.kind)
+    newest = time.time() - grace
+    for batch in _batches(_walk(storage, shard.root, shard.recursive)):
+        result.files += len(batch)
+        result.bytes += sum(size for _, size, _ in batch)
+        # Свежие файлы могут быть ещё не сохранённой загрузкой.
+        candidates = {name: size for name, size, mtime in batch
+                      if mtime < newest}
+        if not candidates:
+            continue
+        alive = referenced(shard.kind, list(candidates))
+        for name, size in candidates.items():
+            if name in alive:
+                continue
+            result.orphans += 1
+            result.orphan_bytes += size
+            if not dry_run:
+                _delete(shard.kind, name)
+                result.deleted += 1
+    return result
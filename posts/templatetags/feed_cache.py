@@ -0,0 +1,76 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from posts.feed_cache import fragment_timeout, render_cards, versions
+from posts.likes import liked_ids
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, page, scopes):
+        self.nodelist = nodelist
+        self.page = page
+        self.scopes = scopes
+
+    def resolve_scopes(self, context):
+        scopes = []
+        for expression in self.scopes:
+            value = expression.resolve(context)
+            if isinstance(value, str):
+                scopes.append(value)
+            else:
+                scopes.extend(value)
+        return scopes
+
+    def cache_key(self, context):
+        page = self.page.resolve(context)
+        request = context.get('request')
+        user = context.get('user')
+        parts = versions(self.resolve_scopes(context))
+        parts.append(getattr(page, 'number', ''))
+        parts.append(request.GET.get('cursor', '') if request else '')
+        parts.append(user.pk if user is not None and user.is_authenticated
+                     else '')
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return 'template.feed_cache.' + digest
+
+    def render(self, context):
+        key = self.cache_key(context)
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, fragment_timeout())
+        return content
+
+
+@register.tag
+def feedcache(parser, token):
+    """{% feedcache page scope [scope ...] %} ... {% endfeedcache %}
+
+    Кэширует фрагмент ленты. Ключ зависит от номера страницы или курсора,
+    пользователя и версий перечисленных лент (см. posts.feed_cache).
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            "'%s' tag requires a page and at least one scope." % bits[0])
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки постов из кэша, см. posts.feed_cache.render_cards."""
+    posts = list(posts)
+    user = context.get('user')
+    liked = liked_ids(user, [post.pk for post in posts])
+    return mark_safe(''.join(render_cards(posts, user, liked)))
@@ -0,0 +1,29 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+@register.inclusion_tag('post_picture.html')
+def post_picture(post):
+    """<picture> с srcset из вариантов картинки (см. posts.thumbnails).
+
+    Варианты в формате JPEG идут в srcset самого <img>, остальные
+    форматы — в <source>, чтобы браузер выбрал тот, что умеет показывать.
+    """
+    sources = {}
+    fallback = []
+    for variant in post.variants.all():
+        candidate = '%s %dw' % (variant.url, variant.width)
+        if variant.format == 'JPEG':
+            fallback.append(candidate)
+        else:
+            sources.setdefault(variant.mime_type, []).append(candidate)
+    return {
+        'post': post,
+        'sources': [{'type': mime_type, 'srcset': ', '.join(candidates)}
+                    for mime_type, candidates in sources.items()],
+        'srcset': ', '.join(fallback),
+        'sizes': getattr(settings, 'THUMBNAIL_SIZES',
+                         '(max-width: 980px) 100vw, 960px'),
+    }
@@ -0,0 +1,98 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def read_json(response):
+    if response.streaming:
+        return json.loads(b''.join(response.streaming_content))
+    return json.loads(response.content)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.posts = [Post.objects.create(text='Пост %d' % number,
+                                          author=self.author,
+                                          group=self.group)
+                      for number in range(3)]
+        self.client = Client()
+
+    def test_feeds_stream_json(self):
+        """Ленты отдаются потоком JSON с курсором следующей страницы"""
+        for url in (reverse('api_index'),
+                    reverse('api_group', args=['group']),
+                    reverse('api_profile', args=['author'])):
+            response = self.client.get(url, {'limit': 2})
+            self.assertTrue(response.streaming)
+            data = read_json(response)
+            self.assertEqual([post['id'] for post in data['results']],
+                             [self.posts[2].pk, self.posts[1].pk])
+            self.assertEqual(data['results'][0]['author'], 'author')
+            self.assertEqual(data['results'][0]['group'], 'group')
+            data = read_json(self.client.get(
+                url, {'limit': 2, 'cursor': data['next_cursor']}))
+            self.assertEqual([post['id'] for post in data['results']],
+                             [self.posts[0].pk])
+            self.assertIsNone(data['next_cursor'])
+
+    def test_not_modified_without_queries(self):
+        """Повторный запрос с ETag получает 304 без запросов к базе"""
+        url = reverse('api_index')
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        read_json(response)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_feed(self):
+        """Комментарий меняет ETag ленты и поста, limit — ETag ленты"""
+        feed = reverse('api_index')
+        post = reverse('api_post', args=['author', self.posts[0].pk])
+        etags = [self.client.get(url)['ETag'] for url in (feed, post)]
+        Comment.objects.create(post=self.posts[0], author=self.reader,
+                               text='!')
+        for url, etag in zip((feed, post), etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        data = read_json(self.client.get(post))
+        self.assertEqual(data['comment_count'], 1)
+        self.assertEqual(data['comments_url'], reverse(
+            'post_comments', args=['author', self.posts[0].pk]))
+        etag = self.client.get(feed)['ETag']
+        self.assertNotEqual(self.client.get(feed, {'limit': 1})['ETag'],
+                            etag)
+
+    def test_follow_feed(self):
+        """Лента подписок только для вошедших, со своим ETag"""
+        url = reverse('api_follow_index')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertEqual(read_json(response)['results'], [])
+        self.assertEqual(response['Vary'], 'Cookie')
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(len(read_json(response)['results']), 3)
+
+    def test_missing_objects(self):
+        """Несуществующие автор, группа и пост дают 404"""
+        for url in (reverse('api_group', args=['nope']),
+                    reverse('api_profile', args=['nope']),
+                    reverse('api_post', args=['reader', self.posts[0].pk])):
+            self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,155 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import likes, write_behind
+from posts.likes import liked_ids
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(text='Текст поста',
+                                        author=self.author)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики обоих пользователей"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_post_comment_and_like_counters(self):
+        """Счетчики постов, комментариев и лайков"""
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        self.post.likes.add(self.reader, self.author)
+        self.reader.blog_posts.remove(self.post)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.total_likes(), 1)
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        """reconcile_counters исправляет рассинхронизацию счетчиков"""
+        Post.objects.update(comment_count=5, like_count=3)
+        UserStats.objects.filter(user=self.author).delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('постов 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.post.like_count),
+                         (0, 0))
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_profile_renders_counts_without_aggregates(self):
+        """Страница профиля берет счетчики из UserStats"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.authorized_client.get(
+            reverse('profile', kwargs={'username': 'author'})
+        )
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Записей: 1')
+
+    def test_like_and_unlike_endpoints(self):
+        """Повторный лайк не меняет счетчик, ответ для скрипта в JSON"""
+        kwargs = {'username': 'author', 'post_id': self.post.pk}
+        like_url = reverse('post_like', kwargs=kwargs)
+        self.assertEqual(self.authorized_client.get(like_url).status_code,
+                         405)
+        response = self.authorized_client.post(like_url)
+        self.assertRedirects(response, reverse('post', kwargs=kwargs))
+        response = self.authorized_client.post(
+            like_url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        response = self.authorized_client.post(
+            reverse('post_unlike', kwargs=kwargs),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'liked': False, 'like_count': 0})
+        self.assertFalse(self.post.likes.exists())
+
+    def test_feed_shows_like_state_of_viewer(self):
+        """Лента показывает, какие посты понравились пользователю"""
+        other = Post.objects.create(text='Другой пост', author=self.author)
+        self.post.likes.add(self.reader)
+        with self.assertNumQueries(1):
+            liked = liked_ids(self.reader, [self.post.pk, other.pk])
+        self.assertEqual(liked, {self.post.pk})
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, 'data-liked="true"', count=1)
+        self.assertContains(response, 'data-liked="false"', count=1)
+
+    @override_settings(POST_COUNTERS_WRITE_BEHIND=True,
+                       POST_COUNTERS_FLUSH_INTERVAL=0)
+    def test_write_behind_buffers_likes_and_views(self):
+        """Лайки и просмотры копятся в буфере и пишутся одной пачкой"""
+        post_url = reverse('post', kwargs={'username': 'author',
+                                           'post_id': self.post.pk})
+        self.assertTrue(likes.like(self.post, self.reader))
+        self.assertFalse(likes.like(self.post, self.reader))
+        self.assertTrue(likes.like(self.post, self.author))
+        for _ in range(3):
+            response = self.authorized_client.get(post_url)
+        self.assertEqual(response.context['view_count'], 3)
+        self.assertEqual(liked_ids(self.reader, [self.post.pk]),
+                         {self.post.pk})
+        self.assertEqual(likes.like_count(self.post.pk), 2)
+        self.assertFalse(self.post.likes.exists())
+
+        with self.assertNumQueries(8):
+            write_behind.buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.view_count), (2, 3))
+        self.assertEqual(len(write_behind.buffer), 0)
+
+    @override_settings(POST_VIEWS_WRITE_BEHIND=True,
+                       POST_COUNTERS_FLUSH_INTERVAL=0)
+    def test_views_do_not_update_post_row(self):
+        """Просмотр страницы поста не пишет в строку поста"""
+        post_url = reverse('post', kwargs={'username': 'author',
+                                           'post_id': self.post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(post_url)
+        self.assertEqual(response.context['view_count'], 1)
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('UPDATE')])
+        write_behind.buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+        with override_settings(POST_VIEWS_WRITE_BEHIND=False):
+            response = self.authorized_client.get(post_url)
+        self.assertIsNone(response.context['view_count'])
+        self.assertNotContains(response, 'Просмотров поста')
+
+    @override_settings(POST_COUNTERS_WRITE_BEHIND=True,
+                       POST_COUNTERS_FLUSH_INTERVAL=0,
+                       POST_COUNTERS_MAX_PENDING=2)
+    def test_write_behind_flushes_when_full(self):
+        """Переполненный буфер сбрасывается сразу"""
+        likes.like(self.post, self.reader)
+        likes.add_view(self.post)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.view_count), (1, 1))
+        likes.unlike(self.post, self.reader)
+        write_behind.buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
@@ -1,13 +1,22 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import skipUnless
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from posts.forms import PostForm
 from posts.models import Group, Post, User
 
 
+def can_save_mpo():
+    Image.init()
+    return 'MPO' in Image.SAVE
+
+
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -100,3 +109,71 @@ class PostCreateFormTests(TestCase):
             text='Текст',
             author=self.user).exists()
         )
+
+
+class PostImageNormalizationTests(TestCase):
+    @staticmethod
+    def photo(size, orientation=None):
+        image = Image.new('RGB', size, 'orange')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        if orientation:
+            exif[0x0112] = orientation
+        content = BytesIO()
+        image.save(content, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile('photo.jpeg', content.getvalue(),
+                                  content_type='image/jpeg')
+
+    def clean_image(self, upload):
+        form = PostForm({'text': 'Фото'}, {'image': upload})
+        form.is_valid()
+        return form
+
+    @override_settings(POST_IMAGE_MAX_SIDE=400)
+    def test_image_is_downscaled_and_metadata_stripped(self):
+        """Большое фото уменьшается, поворачивается по EXIF и теряет EXIF"""
+        form = self.clean_image(self.photo((1200, 600), orientation=6))
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (200, 400))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertFalse(image.getexif())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_are_rejected(self):
+        """Картинка с лишними пикселями отклоняется до декодирования"""
+        form = self.clean_image(self.photo((100, 100)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_large_file_is_rejected(self):
+        """Слишком большой файл отклоняется"""
+        form = self.clean_image(self.photo((100, 100)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_truncated_image_is_rejected(self):
+        """Обрезанный JPEG дает ошибку формы, а не исключение"""
+        content = self.photo((300, 200)).read()
+        upload = SimpleUploadedFile('photo.jpeg', content[:len(content) // 2],
+                                    content_type='image/jpeg')
+        form = self.clean_image(upload)
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @skipUnless(can_save_mpo(), 'MPO сохраняется начиная с Pillow 9.3')
+    def test_camera_mpo_is_stripped(self):
+        """Многокадровый MPO с камеры пересохраняется без EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        content = BytesIO()
+        Image.new('RGB', (300, 200), 'orange').save(
+            content, 'MPO', save_all=True, exif=exif.tobytes(),
+            append_images=[Image.new('RGB', (300, 200), 'blue')])
+        form = self.clean_image(SimpleUploadedFile(
+            'photo.jpeg', content.getvalue(), content_type='image/jpeg'))
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertFalse(image.getexif())
@@ -0,0 +1,60 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+# Таблица читается целиком, если в плане «SCAN posts_post» (в старых
+# SQLite «SCAN TABLE posts_post») без индекса, или если обход идёт по
+# индексу, но потом строки всё равно сортируются во временном B-дереве.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)?$')
+SCAN = re.compile(r'^SCAN (TABLE )?\S+')
+SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Группа')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='!')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            steps = [row[-1] for row in cursor.fetchall()]
+        pattern = SCAN if SORT in steps else FULL_SCAN
+        return [step for step in steps if pattern.match(step)]
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не читают таблицы целиком"""
+        urls = [
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+            reverse('post', kwargs={'username': self.author.username,
+                                    'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url)
+            for query in context.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertEqual(self.full_scans(query['sql']), [])
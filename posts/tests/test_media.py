@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts import media, thumbnails
+from posts.models import Post, StoredFile, User
+from posts.storage import post_image_storage
+from sorl.thumbnail.default import storage as thumbnail_storage
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, text, name='picture.gif'):
+        image = SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+        self.authorized_client.post(reverse('new_post'),
+                                    {'text': text, 'image': image})
+        return Post.objects.get(text=text)
+
+    def refcount(self, name):
+        return StoredFile.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом с общими миниатюрами"""
+        first = self.upload('Первый', 'one.gif')
+        second = self.upload('Второй', 'two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w\w/\w\w/\w{64}\.png$')
+        self.assertTrue(post_image_storage.exists(first.image.name))
+        self.assertEqual(self.refcount(first.image.name), 2)
+        self.assertEqual(thumbnails.generate(first.pk),
+                         thumbnails.generate(second.pk))
+
+    def test_orphans_are_collected(self):
+        """Файл без ссылок удаляется вместе с миниатюрами"""
+        first = self.upload('Первый')
+        second = self.upload('Второй')
+        name = first.image.name
+        thumbnail = thumbnails.generate(first.pk)
+
+        first.delete()
+        self.assertEqual(self.refcount(name), 1)
+        self.assertEqual(media.collect(timedelta(0)), [])
+
+        second.delete()
+        self.assertEqual(self.refcount(name), 0)
+        self.assertEqual(media.collect(timedelta(hours=1)), [])
+        self.assertEqual(media.collect(timedelta(0)), [name])
+        self.assertFalse(post_image_storage.exists(name))
+        self.assertFalse(thumbnail_storage.exists(thumbnail))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_sweep_deletes_only_unreferenced_files(self):
+        """sweep_media удаляет файлы и миниатюры без ссылок"""
+        post = self.upload('Живой')
+        thumbnail = thumbnails.generate(post.pk)
+        stray_image = post_image_storage.save('posts/old.gif',
+                                              ContentFile(SMALL_GIF))
+        legacy_image = thumbnail_storage.save('posts/legacy.gif',
+                                              ContentFile(SMALL_GIF))
+        stray_thumbnail = thumbnail_storage.save('cache/00/00/stray.jpg',
+                                                 ContentFile(SMALL_GIF))
+        Post.objects.create(text='Старый', author=self.user,
+                            image=legacy_image)
+
+        output = StringIO()
+        call_command('sweep_media', grace=0, workers=1, stdout=output)
+        self.assertIn('без ссылок 2', output.getvalue())
+        self.assertTrue(post_image_storage.exists(stray_image))
+
+        call_command('sweep_media', delete=True, grace=0, workers=1,
+                     stdout=StringIO())
+        for name in (stray_image, stray_thumbnail):
+            self.assertFalse(os.path.exists(thumbnail_storage.path(name)))
+        for name in (post.image.name, legacy_image, thumbnail):
+            self.assertTrue(os.path.exists(thumbnail_storage.path(name)))
@@ -0,0 +1,72 @@
+import base64
+import json
+
+from django.core.paginator import Page
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+from posts.paginator import CursorPage, CursorPaginator
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='test_user')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(13)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_cursor_walks_forward_and_back(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.page()
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertFalse(first.has_previous())
+
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(list(second), self.posts[10:])
+        self.assertFalse(second.has_next())
+
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual(list(back), self.posts[:10])
+        self.assertTrue(back.has_next())
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.guest_client.get(reverse('index') + '?cursor=xx!')
+        self.assertIsInstance(response.context['page'], CursorPage)
+        self.assertEqual(list(response.context['page']), self.posts[:10])
+
+    def test_cursor_with_bad_values_returns_first_page(self):
+        """Курсор с несуществующей датой или нечисловым id тоже"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        for values in (['2020-02-31T00:00:00', 1],
+                       [self.posts[0].pub_date.isoformat(), 'abc'],
+                       [None, 1]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(['n', values]).encode()).decode()
+            response = self.guest_client.get(reverse('index'),
+                                             {'cursor': cursor})
+            self.assertEqual(list(response.context['page']), self.posts[:10])
+            self.assertEqual(paginator.decode_cursor(cursor), ('n', None))
+
+    def test_page_mode_is_default(self):
+        """По умолчанию ленты используют обычный Page"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertIsInstance(response.context['page'], Page)
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_cursor_mode_renders_links(self):
+        """В курсорном режиме паджинатор выводит ссылку по курсору"""
+        response = self.guest_client.get(
+            reverse('profile', kwargs={'username': self.user.username})
+        )
+        page = response.context['page']
+        self.assertContains(response, f'?cursor={page.next_cursor}')
+        self.assertEqual(page.paginator.count, 13)
@@ -0,0 +1,171 @@
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Group, Post, User
+from posts.search.analysis import analyze, stem
+from posts.search.suggest import PrefixIndex, suggester
+
+SEARCH_URL = reverse('search_results')
+SUGGEST_URL = reverse('search_suggest')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Fedor')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.post = Post.objects.create(
+            text='Читаю <b>Толкина</b> и пью чай',
+            author=self.user,
+        )
+        self.other_post = Post.objects.create(
+            text='Смотрю кино',
+            author=self.user,
+        )
+
+    def search(self, query):
+        response = self.guest_client.get(SEARCH_URL, {'q': query})
+        return list(response.context['search_results'])
+
+    def test_missing_query_returns_nothing(self):
+        """Поиск без запроса не падает и ничего не находит"""
+        response = self.guest_client.get(SEARCH_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['search_results']), [])
+
+    def test_posts_and_comments_are_searchable(self):
+        """Находятся посты по своему тексту и по тексту комментариев"""
+        self.assertEqual(self.search('толкина'), [self.post])
+        Comment.objects.create(post=self.other_post, author=self.user,
+                               text='Отличный фильм')
+        self.assertEqual(self.search('фильм'), [self.other_post])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        self.post.text = 'Читаю Пратчетта'
+        self.post.save()
+        self.assertEqual(self.search('толкина'), [])
+        self.assertEqual(self.search('пратчетта'), [self.post])
+        self.post.delete()
+        self.assertEqual(self.search('пратчетта'), [])
+
+    @override_settings(POSTS_SEARCH_MAX_CANDIDATES=2)
+    def test_only_newest_matches_are_ranked(self):
+        """Считаются и ранжируются только самые новые совпадения"""
+        newer = [Post.objects.create(text=f'Пью чай {i}', author=self.user)
+                 for i in range(2)]
+        response = self.guest_client.get(SEARCH_URL, {'q': 'чай'})
+        self.assertEqual(response.context['page'].paginator.count, 2)
+        self.assertCountEqual(response.context['search_results'], newer)
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        """Совпадение подсвечено, а HTML из текста экранирован"""
+        response = self.guest_client.get(SEARCH_URL, {'q': 'чай'})
+        self.assertContains(response, '<mark>чай</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_inflected_forms_are_found(self):
+        """Поиск находит другие формы слова и не различает е и ё"""
+        post = Post.objects.create(text='Мой ёжик любит яблоки',
+                                   author=self.user)
+        self.assertEqual(self.search('ежика с яблоком'), [post])
+        response = self.guest_client.get(SEARCH_URL, {'q': 'ЯБЛОКО'})
+        self.assertContains(response, '<mark>яблоки</mark>')
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        suggester.index = None
+        self.user = User.objects.create_user(username='tolkien')
+        Group.objects.create(title='Толкинисты', slug='tolkienists')
+        Post.objects.create(text='Толкование снов', author=self.user)
+        self.guest_client = Client()
+
+    def suggest(self, query):
+        response = self.guest_client.get(SUGGEST_URL, {'q': query})
+        return [(item['type'], item['value'])
+                for item in response.json()['suggestions']]
+
+    def test_prefix_matches_users_groups_and_terms(self):
+        """Префикс находит пользователей, группы и слова из постов"""
+        self.assertCountEqual(self.suggest('tol'),
+                              [('user', 'tolkien'), ('group', 'tolkienists')])
+        self.assertCountEqual(self.suggest('ТОЛК'),
+                              [('group', 'tolkienists'),
+                               ('term', 'толкование')])
+
+    def test_index_is_updated_without_queries(self):
+        """Новые объекты попадают в подсказки, а запрос не ходит в базу"""
+        self.suggest('tol')
+        User.objects.create_user(username='tolstoy')
+        Group.objects.create(title='Толстовцы', slug='tolstoyans')
+        with self.assertNumQueries(0):
+            self.assertCountEqual(self.suggest('tols'),
+                                  [('user', 'tolstoy'),
+                                   ('group', 'tolstoyans')])
+
+    def test_empty_query(self):
+        """Пустой запрос не возвращает подсказок"""
+        self.assertEqual(self.suggest(''), [])
+
+    def test_index_from_pairs_matches_added_keys(self):
+        """Индекс, собранный сортировкой, совпадает с индексом из add"""
+        pairs = [('Толк', ('term', 'толк', 'толк', 1)),
+                 ('abc', ('user', 'abc', '@abc', 0)),
+                 ('толк', ('term', 'толк', 'толк', 2)),
+                 ('Ab', ('group', 'ab', '#Ab', 0))]
+        index = PrefixIndex()
+        for key, entry in pairs:
+            index.add(key, entry)
+        built = PrefixIndex.from_pairs(pairs)
+        self.assertEqual(list(built.items()), list(index.items()))
+        self.assertEqual(built.search('то', 10),
+                         [('term', 'толк', 'толк', 2)])
+
+    def test_added_keys_are_merged_in_batches(self):
+        """Новые ключи копятся отдельно и сливаются с индексом пачкой"""
+        index = PrefixIndex.from_pairs([('b', ('user', 'b', '@b', 1))])
+        with mock.patch('posts.search.suggest.PENDING_SIZE', 3):
+            index.add_many([('c', ('user', 'c', '@c', 1)),
+                            ('a', ('user', 'a', '@a', 1))])
+            self.assertEqual(index._sorted[0], ['b'])
+            self.assertEqual(index.search('a', 10), [('user', 'a', '@a', 1)])
+            index.add('d', ('user', 'd', '@d', 1))
+        self.assertEqual(index._sorted[0], ['a', 'b', 'c', 'd'])
+        self.assertEqual(index._pending, ([], []))
+
+    def test_term_counts_follow_edits_and_deletes(self):
+        """Правка и удаление поста меняют частоты слов, а не копят их"""
+        self.suggest('tol')
+        post = Post.objects.get()
+        post.text = 'Толкование снов и толкование знаков'
+        post.save()
+        post.save()
+        self.assertEqual(suggester.term_counts['толкование'], 2)
+        self.assertEqual(suggester.term_counts['знаков'], 1)
+        post.delete()
+        self.assertEqual(suggester.term_counts['толкование'], 0)
+        self.assertEqual(self.suggest('толк'), [('group', 'tolkienists')])
+
+
+class AnalysisTests(TestCase):
+    def test_stem(self):
+        """Стеммер сводит формы слова к общей основе"""
+        words = {
+            'книги': 'книг',
+            'красивая': 'красив',
+            'величественный': 'величествен',
+            'веселость': 'весел',
+            'интереснейший': 'интересн',
+        }
+        for word, expected in words.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_analyze_drops_stopwords_and_folds_yo(self):
+        """Стоп-слова отбрасываются, ё заменяется на е"""
+        self.assertEqual(analyze('Я и Ёжик, и ЁЖИКИ'), ['ежик', 'ежик'])
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import thumbnails
+from posts.models import Post, User
+from sorl.thumbnail.default import storage
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name=name, content=SMALL_GIF,
+                              content_type='image/gif')
+
+
+def uploaded_photo(size=(800, 400)):
+    content = BytesIO()
+    Image.new('RGB', size, 'teal').save(content, 'PNG')
+    return SimpleUploadedFile(name='photo.png', content=content.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(text='Картина', author=self.user,
+                                        image=uploaded())
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_generate_stores_thumbnail_name(self):
+        """Готовая миниатюра записывается в пост и выводится в ленте"""
+        name = thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, name)
+        self.assertTrue(storage.exists(name))
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, self.post.thumbnail_url)
+
+    def test_cached_feed_shows_thumbnail_once_built(self):
+        """Лента, закэшированная до миниатюры, обновляется после неё"""
+        post = Post.objects.create(text='Фото', author=self.user,
+                                   image=uploaded_photo())
+        response = self.authorized_client.get(reverse('index'))
+        self.assertNotContains(response, '<source type="image/webp"')
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, post.thumbnail_url)
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_new_image_resets_thumbnail(self):
+        """После замены картинки старая миниатюра не показывается"""
+        Post.objects.filter(pk=self.post.pk).update(thumbnail='old.jpg')
+        self.authorized_client.post(
+            reverse('post_edit', kwargs={'username': self.user.username,
+                                         'post_id': self.post.pk}),
+            {'text': 'Новая картина', 'image': uploaded('new.gif')},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, '')
+
+    def test_command_fills_missing_thumbnails(self):
+        """Команда строит миниатюры для постов без них"""
+        call_command('generate_thumbnails', workers=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail)
+
+    def test_variants_for_srcset(self):
+        """Строятся варианты нескольких ширин и форматов без растягивания"""
+        post = Post.objects.create(text='Фото', author=self.user,
+                                   image=uploaded_photo())
+        thumbnails.generate(post.pk)
+        variants = sorted((variant.format, variant.width, variant.height)
+                          for variant in post.variants.all())
+        self.assertEqual(variants, [
+            ('JPEG', 320, 160), ('JPEG', 640, 320), ('JPEG', 800, 400),
+            ('WEBP', 320, 160), ('WEBP', 640, 320), ('WEBP', 800, 400),
+        ])
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, post.variants.first().url + ' 320w')
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Follow, Post, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+
+    @override_settings(TIMELINE_BACKFILL_LIMIT=1)
+    def test_backfill_takes_newest_posts(self):
+        """Подписка добавляет в ленту только последние посты автора"""
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader)
+                 .values_list('post', flat=True)),
+            [post.pk])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленту подписчиков при сохранении"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        entry = TimelineEntry.objects.get(user=self.reader, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+
+    def test_unfollow_purges_timeline(self):
+        """Отписка удаляет посты автора из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.authorized_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TIMELINE_WORKERS=0)
+    def test_author_below_limit_is_fanned_out_again(self):
+        """Когда автор перестает быть популярным, его посты, написанные
+        раньше, раскладываются по лентам всех подписчиков после коммита"""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        with mock.patch('posts.timeline.transaction.on_commit') as on_commit:
+            Follow.objects.filter(user=other).delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        on_commit.assert_called_once()
+        on_commit.call_args[0][0]()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader)
+                .values_list('post', flat=True)),
+            {post.pk, self.old_post.pk})
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_is_read_on_request(self):
+        """Посты популярного автора не раскладываются по лентам,
+        но все равно видны подписчикам"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [post, self.old_post])
@@ -5,11 +5,13 @@ import tempfile
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from posts.models import Follow, Group, Post, User
+from posts.feed_cache import render_cards
+from posts.models import Comment, Follow, Group, Post, User
 from yatube.settings import BASE_DIR
 
 
@@ -56,6 +58,7 @@ class PostsPagesTests(TestCase):
         super().tearDownClass()
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -178,6 +181,11 @@ class PostsPagesTests(TestCase):
         """Проверяем работу кэша на главной странице"""
         response_one = self.authorized_client.get(reverse('index'))
 
+        # update() не отправляет сигналов, поэтому лента берётся из кэша
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response_two = self.authorized_client.get(reverse('index'))
+        self.assertEqual(response_one.content, response_two.content)
+
         test_group = Group.objects.create(
             title='Какое-то название',
             slug='some-slug',
@@ -190,14 +198,30 @@ class PostsPagesTests(TestCase):
             author=PostsPagesTests.user,
         )
 
-        response_two = self.authorized_client.get(reverse('index'))
-        self.assertEqual(response_one.content, response_two.content)
-        cache.clear()
-
         response_two = self.authorized_client.get(reverse('index'))
         self.assertNotEqual(response_one.content, response_two.content)
+        self.assertContains(response_two, 'Новый пост')
         self.assertEqual(response_two.context['page'][0], test_post)
 
+    def test_feed_cache_is_invalidated_by_comments(self):
+        """Комментарий сразу обновляет закэшированную ленту группы"""
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.assertNotContains(self.guest_client.get(url), 'Комментариев')
+        Comment.objects.create(post=self.post, author=self.client2,
+                               text='Комментарий')
+        self.assertContains(self.guest_client.get(url), 'Комментариев: 1')
+
+    def test_follow_feed_cache_is_per_user(self):
+        """Лента подписок одного пользователя не попадает к другому"""
+        url = reverse('follow_index')
+        self.assertContains(self.authorized_client.get(url), 'Текст поста')
+        self.assertNotContains(self.authorized_client_2.get(url),
+                               'Текст поста')
+        self.authorized_client_2.get(
+            reverse('profile_follow', kwargs={'username': self.user.username})
+        )
+        self.assertContains(self.authorized_client_2.get(url), 'Текст поста')
+
     def test_authorized_user_can_follow(self):
         """Проверяем, что авторизованный пользователь может подписываться
         на других пользователей"""
@@ -273,3 +297,247 @@ class PaginatorViewsTest(TestCase):
         """Проверяем, что количество постов на первой странице равно 3"""
         response = self.client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='test_user')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='slug',
+            description='Тестовая группа',
+        )
+        for i in range(10):
+            post = Post.objects.create(
+                text='Пример поста',
+                author=cls.user,
+                group=cls.group,
+            )
+            Comment.objects.create(post=post, author=cls.user, text='Ответ')
+            post.likes.add(cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_feed_pages_use_fixed_number_of_queries(self):
+        """Число запросов ленты не зависит от количества постов"""
+        urls_queries = {
+            reverse('index'): 3,
+            reverse('group', kwargs={'slug': self.group.slug}): 4,
+        }
+        for url, queries in urls_queries.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(url)
+                self.assertContains(response, 'Комментариев: 1')
+                self.assertContains(response, 'Нравится: 1')
+
+    def test_post_cards_are_cached(self):
+        """Карточки постов берутся из кэша, пока пост не изменится"""
+        post = Post.objects.for_feed().first()
+        render_cards([post], AnonymousUser())
+        with self.assertTemplateNotUsed('post_item.html'):
+            render_cards([post], AnonymousUser())
+
+        self.assertIn('Редактировать', render_cards([post], self.user)[0])
+        self.assertNotIn('Редактировать',
+                         render_cards([post], AnonymousUser())[0])
+
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertIn('Исправленный текст',
+                      render_cards([post], AnonymousUser())[0])
+
+    def test_like_button_depends_on_login(self):
+        """Кнопка лайка не попадает в карточку анонима и наоборот"""
+        reader = User.objects.create(username='reader')
+        post = Post.objects.for_feed().first()
+        self.assertNotIn('data-like-url',
+                         render_cards([post], AnonymousUser())[0])
+        self.assertIn('data-like-url', render_cards([post], reader)[0])
+        cache.clear()
+        render_cards([post], reader)
+        self.assertNotIn('data-like-url',
+                         render_cards([post], AnonymousUser())[0])
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='commentator')
+        cls.post = Post.objects.create(text='Обсуждаемый', author=cls.user)
+        other = Post.objects.create(text='Другой', author=cls.user)
+        Comment.objects.create(post=other, author=cls.user, text='Чужой')
+        for i in range(25):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Комментарий {i}')
+        cls.kwargs = {'username': cls.user.username, 'post_id': cls.post.pk}
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_page_shows_first_page_of_its_comments(self):
+        """На странице поста первые комментарии этого поста"""
+        response = self.guest_client.get(reverse('post', kwargs=self.kwargs))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertNotContains(response, 'Чужой')
+        self.assertTrue(response.context['comments_cursor'])
+
+    def test_load_more_returns_next_comments(self):
+        """Кнопка «Показать ещё» получает следующую страницу в JSON"""
+        response = self.guest_client.get(reverse('post', kwargs=self.kwargs))
+        url = reverse('post_comments', kwargs=self.kwargs)
+        with self.assertNumQueries(2):
+            data = self.guest_client.get(
+                url, {'cursor': response.context['comments_cursor']}).json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         [f'Комментарий {i}' for i in range(20, 25)])
+        self.assertIsNone(data['next_cursor'])
+
+    def reply_chain(self, root, length):
+        chain = [root]
+        for i in range(length):
+            chain.append(Comment.objects.create(
+                parent=chain[-1], author=self.user, text=f'Ответ {i + 1}'))
+        return chain
+
+    def test_replies_are_stored_as_thread(self):
+        """Ответы хранят путь ветки и счетчики ответов предков"""
+        root = self.post.comments.order_by('pk').first()
+        chain = self.reply_chain(root, 4)
+        self.assertEqual([comment.depth for comment in chain],
+                         [0, 1, 2, 3, 4])
+        self.assertTrue(chain[-1].path.startswith(chain[2].path))
+        root.refresh_from_db()
+        self.assertEqual(root.reply_count, 4)
+        with self.assertNumQueries(1):
+            subtree = list(Comment.objects.subtree(chain[1].path))
+        self.assertEqual(subtree, chain[1:])
+
+        chain[1].delete()
+        root.refresh_from_db()
+        self.assertEqual(root.reply_count, 0)
+
+    def test_replies_are_rendered_to_max_depth(self):
+        """Ответы глубже COMMENTS_MAX_DEPTH подгружаются отдельно"""
+        root = self.post.comments.order_by('pk').first()
+        chain = self.reply_chain(root, 4)
+        response = self.guest_client.get(reverse('post', kwargs=self.kwargs))
+        thread = response.context['comment_thread']
+        self.assertEqual(thread[:4], chain[:4])
+        self.assertNotContains(response, 'Ответ 4')
+        self.assertContains(response, f'data-thread="{chain[3].pk}"')
+        self.assertTrue(response.context['comments_cursor'])
+
+        data = self.guest_client.get(
+            reverse('post_comments', kwargs=self.kwargs),
+            {'thread': chain[3].pk}).json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['Ответ 4'])
+
+    @override_settings(COMMENTS_REPLIES_PER_THREAD=3)
+    def test_large_thread_is_loaded_in_pages(self):
+        """Большая ветка показывает первые ответы, остальные — по курсору"""
+        first, second = self.post.comments.order_by('pk')[:2]
+        replies = [Comment.objects.create(parent=first, author=self.user,
+                                          text=f'Ответ {i}')
+                   for i in range(5)]
+        small = Comment.objects.create(parent=second, author=self.user,
+                                       text='Единственный ответ')
+        response = self.guest_client.get(reverse('post', kwargs=self.kwargs))
+        thread = response.context['comment_thread']
+        self.assertEqual(thread[:6], [first, *replies[:3], second, small])
+        self.assertContains(response, 'data-more-replies data-thread',
+                            count=1)
+        self.assertContains(response, f'data-cursor="{replies[2].path}"')
+
+        url = reverse('post_comments', kwargs=self.kwargs)
+        data = self.guest_client.get(url, {'thread': first.pk,
+                                           'cursor': replies[2].path}).json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['Ответ 3', 'Ответ 4'])
+        self.assertIsNone(data['next_cursor'])
+        data = self.guest_client.get(url, {'thread': first.pk}).json()
+        self.assertEqual(len(data['comments']), 3)
+        self.assertEqual(data['next_cursor'], replies[2].path)
+
+    def test_reply_parent_is_taken_from_post_data(self):
+        """Ответ на комментарий отправляется той же формой"""
+        root = self.post.comments.order_by('pk').first()
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('add_comment', kwargs=self.kwargs),
+                    {'text': 'Ответ на корень', 'parent': root.pk})
+        reply = Comment.objects.get(text='Ответ на корень')
+        self.assertEqual((reply.parent, reply.post), (root, self.post))
+
+
+class FeedHttpCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+        self.guest_client = Client()
+        self.urls = (reverse('index'),
+                     reverse('group', kwargs={'slug': 'group'}),
+                     reverse('profile', kwargs={'username': 'author'}))
+
+    def test_anonymous_feeds_are_public(self):
+        """Ленты для анонимов публичные, повторный запрос получает 304"""
+        for url in self.urls:
+            response = self.guest_client.get(url)
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('stale-while-revalidate', response['Cache-Control'])
+            self.assertIn('Cookie', response['Vary'])
+            self.assertFalse(response.cookies)
+            with self.assertNumQueries(1 if url != reverse('index') else 0):
+                again = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, 304)
+
+    def test_etag_follows_feed_versions(self):
+        """Новый пост и новый подписчик меняют ETag ленты"""
+        etags = [self.guest_client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(text='Ещё пост', author=self.author,
+                            group=self.group)
+        for url, etag in zip(self.urls, etags):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertContains(response, 'Ещё пост')
+        url = self.urls[2]
+        etag = self.guest_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_rename_refreshes_feeds(self):
+        """Новое название группы видно в лентах, старый ETag не подходит"""
+        etags = [self.guest_client.get(url)['ETag'] for url in self.urls]
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        for url, etag in zip(self.urls, etags):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertContains(response, '#Новое название')
+
+    def test_authorized_feeds_are_private(self):
+        """Вошедший пользователь получает свежую личную страницу"""
+        client = Client()
+        client.force_login(self.reader)
+        for url in self.urls:
+            response = client.get(url)
+            self.assertIn('private', response['Cache-Control'])
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertNotIn('ETag', response)
+            self.assertIn('csrftoken', response.cookies)
@@ -0,0 +1,123 @@
+"""Миниатюры картинок постов строятся заранее в пуле потоков.
+
+После сохранения поста с новой картинкой задача ставится в пул (после
+коммита транзакции), а имя готовой миниатюры записывается в
+Post.thumbnail. Шаблон берёт URL из этого поля и не трогает ни картинку,
+ни хранилище ключей sorl. Пока миниатюры нет, работает {% thumbnail %}
+с теми же параметрами, так что файл получается тот же.
+
+Там же строятся варианты картинки нескольких ширин и форматов
+(ImageVariant) для srcset. Они лежат в том же кэше sorl под MEDIA_ROOT.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+from . import feed_cache
+from .models import ImageVariant, Post
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY = '960'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+
+
+def workers():
+    return getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+
+def variant_widths():
+    return getattr(settings, 'THUMBNAIL_VARIANT_WIDTHS', (320, 640, 960))
+
+
+def variant_formats():
+    formats = getattr(settings, 'THUMBNAIL_VARIANT_FORMATS',
+                      ('WEBP', 'JPEG'))
+    # sorl умеет сохранять только форматы, для которых знает расширение.
+    return [name for name in formats if name in EXTENSIONS]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers(),
+                                       thread_name_prefix='thumbnails')
+    return _executor
+
+
+def generate(post_id):
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return None
+    try:
+        thumbnail = get_thumbnail(post.image, GEOMETRY, **OPTIONS)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру поста %s', post_id)
+        return None
+    # Картинку могли заменить, пока строилась миниатюра.
+    current = Post.objects.filter(pk=post_id, image=post.image.name)
+    if not current.exists():
+        return thumbnail.name
+    # Варианты пишутся раньше миниатюры: карточка с миниатюрой сразу
+    # кэшируется с srcset, см. feed_cache.card_key.
+    build_variants(post)
+    if current.update(thumbnail=thumbnail.name):
+        # update() не меняет updated и не шлёт сигналов, а лента могла
+        # закэшироваться с {% thumbnail %}, пока миниатюры не было.
+        feed_cache.bump_posts([post_id])
+    return thumbnail.name
+
+
+def build_variants(post):
+    variants = {}
+    for image_format in variant_formats():
+        for width in variant_widths():
+            try:
+                image = get_thumbnail(post.image, str(width),
+                                      format=image_format, upscale=False)
+            except Exception:
+                logger.exception('Не удалось построить вариант %s %s '
+                                 'картинки поста %s', width, image_format,
+                                 post.pk)
+                continue
+            # Маленькая картинка не растягивается, и разные ширины дают
+            # один и тот же файл.
+            variants[image.width, image_format] = ImageVariant(
+                post=post, name=image.name, width=image.width,
+                height=image.height, format=image_format,
+            )
+    with transaction.atomic():
+        ImageVariant.objects.filter(post=post).delete()
+        ImageVariant.objects.bulk_create(variants.values())
+    return list(variants.values())
+
+
+def build(post_id):
+    close_old_connections()
+    try:
+        return generate(post_id)
+    finally:
+        close_old_connections()
+
+
+def reset(post):
+    """Забывает миниатюру и варианты картинки, которую заменили."""
+    post.thumbnail = ''
+    if post.pk is not None:
+        ImageVariant.objects.filter(post=post).delete()
+
+
+def schedule(post):
+    """Строит миниатюру поста после коммита текущей транзакции."""
+    if not post.image:
+        return
+    if workers() == 0:
+        transaction.on_commit(lambda: generate(post.pk))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(build, post.pk))
@@ -0,0 +1,149 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_executor = None
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def backfill_limit():
+    return getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+
+
+def workers():
+    return getattr(settings, 'TIMELINE_WORKERS', 1)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers(),
+                                       thread_name_prefix='timeline')
+    return _executor
+
+
+def is_heavy(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gt=fanout_limit()).exists()
+
+
+def heavy_authors(user):
+    """Авторы из подписок пользователя, которые читаются при запросе."""
+    followed = Follow.objects.filter(user=user).values('author')
+    return list(
+        User.objects.filter(pk__in=followed,
+                            stats__followers_count__gt=fanout_limit())
+        .values_list('pk', flat=True)
+    )
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    if post.author_id is None or is_heavy(post.author_id):
+        return
+    followers = (Follow.objects
+                 .filter(author_id=post.author_id, user__isnull=False)
+                 .values_list('user_id', flat=True)
+                 .distinct())
+    _bulk_insert([
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers
+    ])
+
+
+def _materialize(user_ids, author_id):
+    # Старые посты в ленту не раскладываются: до них почти не листают.
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date')
+             .values_list('pk', 'pub_date')[:backfill_limit()]
+             .iterator())
+    batch = []
+    for post_id, pub_date in posts:
+        for user_id in user_ids:
+            batch.append(TimelineEntry(user_id=user_id, post_id=post_id,
+                                       pub_date=pub_date))
+            if len(batch) >= BATCH_SIZE:
+                _bulk_insert(batch)
+                batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def backfill(user_id, author_id):
+    if user_id is None or author_id is None or is_heavy(author_id):
+        return
+    _materialize([user_id], author_id)
+
+
+def rebalance(author_id):
+    """Автор, опустившийся до порога после отписки, больше не читается
+    при запросе. Его посты раскладываются по лентам всех подписчиков:
+    пока он был популярным, новые посты и новые подписки не
+    раскладывались."""
+    if not UserStats.objects.filter(
+            user_id=author_id, followers_count__lte=fanout_limit()).exists():
+        return
+    followers = list(Follow.objects
+                     .filter(author_id=author_id, user__isnull=False)
+                     .values_list('user_id', flat=True)
+                     .distinct())
+    _materialize(followers, author_id)
+
+
+def _run_rebalance(author_id):
+    close_old_connections()
+    try:
+        rebalance(author_id)
+    except Exception:
+        logger.exception('Не удалось разложить посты автора %s', author_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_rebalance(author_id):
+    """Запускает rebalance после коммита, если автор только что
+    опустился до порога. Работа идёт в пуле потоков, а не в запросе."""
+    if author_id is None or not UserStats.objects.filter(
+            user_id=author_id, followers_count=fanout_limit()).exists():
+        return
+    if workers() == 0:
+        transaction.on_commit(lambda: rebalance(author_id))
+    else:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_rebalance, author_id))
+
+
+def purge(user_id, author_id):
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        return
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__in=Post.objects.filter(author_id=author_id).values('pk'),
+    ).delete()
+
+
+def follow_feed(user, heavy=None):
+    if heavy is None:
+        heavy = heavy_authors(user)
+    if not heavy:
+        return (Post.objects.filter(timeline_entries__user=user)
+                .order_by('-timeline_entries__pub_date'))
+    fanned_out = TimelineEntry.objects.filter(user=user).values('post')
+    return Post.objects.filter(Q(pk__in=fanned_out) | Q(author__in=heavy))
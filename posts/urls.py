@@ -1,13 +1,20 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 from .views import AddGroupView
 
 urlpatterns = [
     path('add_group/', AddGroupView.as_view(), name='add_group'),
     path('search/', views.search, name='search_results'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
 #     path('search/', SearchResultsView.as_view(), name='search_results'),
     path('', views.index, name='index'),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/follow/', api.follow_index, name='api_follow_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group'),
+    path('api/<str:username>/posts/', api.profile, name='api_profile'),
+    path('api/<str:username>/<int:post_id>/', api.post_detail,
+         name='api_post'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         '<str:username>/follow/', views.profile_follow,
@@ -23,5 +30,11 @@ urlpatterns = [
          name='post_edit'),
     path('<str:username>/<int:post_id>/comment', views.add_comment,
          name="add_comment"),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('<str:username>/<int:post_id>/like/', views.post_like,
+         name='post_like'),
+    path('<str:username>/<int:post_id>/unlike/', views.post_unlike,
+         name='post_unlike'),
     
 ]
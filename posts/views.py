@@ -1,19 +1,43 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView
 
+from yatube.db.replicas import pin_primary, read_only
+
+from . import feed_cache, likes, thumbnails
+from .counters import user_stats
 from .forms import CommentForm, PostForm
+from .http_cache import feed_response
 from .models import Follow, Group, Post, User
 from .modules import is_follower
+from .paginator import (NEXT, PER_PAGE, comment_paginator, comment_threads,
+                        max_comment_depth, paginate, thread_replies)
+from .search import get_backend
+from .search.suggest import suggester
+from .timeline import follow_feed, heavy_authors
 
 
+@read_only
 def search(request):
-    query = request.GET.get('q')
-    search_results = Post.objects.filter(text__icontains=query)
-    return render(request, 'search_results.html', {'query': query, 'search_results': search_results})
+    query = request.GET.get('q', '').strip()
+    results = get_backend().search(query) if query else []
+    paginator = Paginator(results, PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'search_results.html', {'query': query,
+                                                   'search_results': page,
+                                                   'page': page})
+
+
+def search_suggest(request):
+    query = request.GET.get('q', '').strip()
+    suggestions = suggester.suggest(query) if query else []
+    return JsonResponse({'query': query, 'suggestions': suggestions})
 
 
 # class SearchResultsView(ListView):
@@ -26,28 +50,34 @@ def search(request):
 #         return object_list
 
 
+@read_only
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {
-        'page': page,
-    }
-    return render(request, 'index.html', context)
+    def respond():
+        post_list = Post.objects.for_feed().order_by('-pub_date')
+        page = paginate(request, post_list)
+        context = {
+            'page': page,
+        }
+        return render(request, 'index.html', context)
+    return feed_response(request, [feed_cache.GLOBAL], (), respond)
 
 
+@read_only
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    group_posts = group.posts.all()
-    paginator = Paginator(group_posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {
-        'group': group,
-        'page': page,
-    }
-    return render(request, 'group.html', context)
+    scope = feed_cache.scope(feed_cache.GROUP, group.pk)
+
+    def respond():
+        group_posts = group.posts.for_feed()
+        page = paginate(request, group_posts)
+        context = {
+            'group': group,
+            'page': page,
+            'feed_scopes': scope,
+        }
+        return render(request, 'group.html', context)
+    return feed_response(request, [scope],
+                         (group.title, group.description), respond)
 
 
 @login_required
@@ -60,37 +90,67 @@ def new_post(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('index')
     return render(request, 'new.html', {'form': form})
 
 
+@read_only
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    profile_posts = author.posts.all()
-    paginator = Paginator(profile_posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    following = False
-    if request.user.is_authenticated:
-        following = is_follower(request.user, author.username)
-    return render(request, 'profile.html', {'profile': author,
-                                            'posts': profile_posts,
-                                            'page': page,
-                                            'following': following,
-                                            'group': group})
-
-
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = user_stats(author)
+    scope = feed_cache.scope(feed_cache.AUTHOR, author.pk)
+
+    def respond():
+        profile_posts = author.posts.for_feed()
+        page = paginate(request, profile_posts)
+        following = False
+        if request.user.is_authenticated:
+            following = is_follower(request.user, author.username)
+        return render(request, 'profile.html', {'profile': author,
+                                                'stats': stats,
+                                                'page': page,
+                                                'following': following,
+                                                'feed_scopes': scope})
+    # Подписчики не меняют версию ленты автора, их число входит в ETag.
+    return feed_response(request, [scope],
+                         (stats.followers_count, stats.following_count),
+                         respond)
+
+
+@ensure_csrf_cookie
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'),
+        author__username=username, id=post_id)
     author = post.author
     current_user = request.user
-    user_posts = author.posts.all()
-    count = user_posts.count()
+    stats = user_stats(author)
+    count = stats.posts_count
     form = CommentForm(request.POST or None)
-    comments = author.comments.all()
-    context = {'post': post, 'author': author, 'count': count,
+    # Первая страница остаётся QuerySet, а есть ли продолжение, видно по
+    # счётчикам: все комментарии поста — это корни страницы и их ответы.
+    paginator = comment_paginator(post.comments.all())
+    comments = paginator.object_list.order_by(
+        *paginator.ordering)[:paginator.per_page]
+    comment_thread = comment_threads(post, comments)
+    comments_cursor = None
+    if post.comment_count > sum(1 + root.reply_count for root in comments):
+        comments_cursor = paginator.encode_cursor(comments[len(comments) - 1],
+                                                  NEXT)
+    liked = post.pk in likes.liked_ids(current_user, [post.pk])
+    view_count = likes.view_count(post)
+    if view_count is not None:
+        # Этот просмотр ещё не в буфере.
+        view_count += 1
+        likes.add_view(post)
+    context = {'post': post, 'author': author, 'stats': stats,
+               'count': count, 'liked': liked, 'view_count': view_count,
                'current_user': current_user, 'form': form,
-               'comments': comments, }
+               'comments': comments, 'comment_thread': comment_thread,
+               'comments_cursor': comments_cursor,
+               'max_depth': max_comment_depth()}
     return render(request, 'post.html', context)
 
 
@@ -102,7 +162,12 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            thumbnails.reset(post)
+        post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('post', username, post_id)
     return render(request, 'new.html', {'form': form, 'post': post})
 
@@ -120,6 +185,38 @@ def server_error(request):
     return render(request, 'misc/500.html', status=500)
 
 
+def post_comments(request, username, post_id):
+    post = get_object_or_404(Post, author__username=username, id=post_id)
+    thread_id = request.GET.get('thread', '')
+    if thread_id.isdigit():
+        # Продолжение ветки корня — до max_depth, как на странице поста,
+        # ответы глубже max_depth — вся ветка. И то и другое страницами.
+        parent = get_object_or_404(post.comments, pk=thread_id)
+        max_depth = max_comment_depth()
+        comments, next_cursor = thread_replies(
+            parent, request.GET.get('cursor'),
+            max_depth if parent.depth < max_depth else None)
+    else:
+        page = comment_paginator(post.comments.all()).page(
+            request.GET.get('cursor'))
+        comments = comment_threads(post, page)
+        next_cursor = page.next_cursor
+    context = {'max_depth': max_comment_depth()}
+    return JsonResponse({
+        'comments': [{
+            'id': comment.pk,
+            'parent': comment.parent_id,
+            'depth': comment.depth,
+            'author': comment.author.username if comment.author else None,
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+            'html': render_to_string('comment_item.html',
+                                     dict(context, item=comment), request),
+        } for comment in comments],
+        'next_cursor': next_cursor,
+    })
+
+
 @login_required
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
@@ -128,20 +225,45 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            comment.parent = post.comments.filter(pk=parent_id).first()
         comment.save()
     return redirect('post', username=username, post_id=post_id)
 
 
+def _set_like(request, username, post_id, action):
+    post = get_object_or_404(Post, author__username=username, id=post_id)
+    action(post, request.user)
+    if not request.is_ajax():
+        return redirect('post', username=username, post_id=post_id)
+    return JsonResponse({'liked': action is likes.like,
+                         'like_count': likes.like_count(post.pk)})
+
+
 @login_required
+@require_POST
+def post_like(request, username, post_id):
+    return _set_like(request, username, post_id, likes.like)
+
+
+@login_required
+@require_POST
+def post_unlike(request, username, post_id):
+    return _set_like(request, username, post_id, likes.unlike)
+
+
+@login_required
+@read_only
+@ensure_csrf_cookie
 def follow_index(request):
-    current_user = request.user
-    post_list = Post.objects.filter(author__following__user=current_user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    heavy = heavy_authors(request.user)
+    post_list = follow_feed(request.user, heavy).for_feed()
+    page = paginate(request, post_list)
     context = {
         'page': page,
-        'paginator': paginator
+        'paginator': page.paginator,
+        'feed_scopes': feed_cache.follow_scopes(request.user, heavy),
     }
     return render(request, 'follow.html', context)
 
@@ -151,6 +273,7 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
         Follow.objects.get_or_create(user=request.user, author=author)
+        pin_primary(request)
     return redirect('profile', username=username)
 
 
@@ -159,6 +282,7 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
         Follow.objects.filter(user=request.user, author=author).delete()
+        pin_primary(request)
     return redirect('profile', username=username)
 
 
@@ -0,0 +1,187 @@
+"""Отложенная запись лайков и просмотров.
+
+SQLite пропускает писателей по одному, и всплеск лайков популярного
+поста выстраивается в очередь за одной строкой Post. Просмотры всегда
+идут через буфер (POST_VIEWS_WRITE_BEHIND), а когда включён
+POST_COUNTERS_WRITE_BEHIND, и лайки. Изменения копятся в памяти процесса
+и раз в POST_COUNTERS_FLUSH_INTERVAL секунд записываются одной
+транзакцией: строки связи пачкой, like_count пересчитывается по ним,
+view_count сдвигается одним UPDATE на каждое значение прироста.
+
+Потери ограничены: при падении процесса пропадает не больше интервала
+и не больше POST_COUNTERS_MAX_PENDING изменений, при переполнении буфер
+сбрасывается сразу в потоке запроса. При штатной остановке буфер
+сбрасывается из atexit, а при ошибке базы изменения возвращаются в буфер.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from . import counters, feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+Like = Post.likes.through
+
+
+def enabled():
+    return getattr(settings, 'POST_COUNTERS_WRITE_BEHIND', False)
+
+
+def views_enabled():
+    # Синхронный UPDATE на каждый просмотр поста — та же очередь за одной
+    # строкой, поэтому просмотры без буфера не считаются.
+    return enabled() or getattr(settings, 'POST_VIEWS_WRITE_BEHIND', True)
+
+
+def flush_interval():
+    return getattr(settings, 'POST_COUNTERS_FLUSH_INTERVAL', 2)
+
+
+def max_pending():
+    return getattr(settings, 'POST_COUNTERS_MAX_PENDING', 1000)
+
+
+class CounterBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._likes = {}
+        self._like_deltas = Counter()
+        self._views = Counter()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def __len__(self):
+        return len(self._likes) + len(self._views)
+
+    def set_like(self, post_id, user_id, liked):
+        """Запоминает лайк или его снятие; False, если ничего не меняется."""
+        key = (post_id, user_id)
+        with self._lock:
+            current = self._likes.get(key)
+        if current is None:
+            current = Like.objects.filter(post_id=post_id,
+                                          user_id=user_id).exists()
+        if current == liked:
+            return False
+        with self._lock:
+            self._likes[key] = liked
+            self._like_deltas[post_id] += 1 if liked else -1
+        self._written()
+        return True
+
+    def add_view(self, post_id):
+        with self._lock:
+            self._views[post_id] += 1
+        self._written()
+
+    def pending_likes(self, user_id, post_ids):
+        with self._lock:
+            return {post_id: self._likes[(post_id, user_id)]
+                    for post_id in post_ids
+                    if (post_id, user_id) in self._likes}
+
+    def pending_like_delta(self, post_id):
+        with self._lock:
+            return self._like_deltas[post_id]
+
+    def pending_views(self, post_id):
+        with self._lock:
+            return self._views[post_id]
+
+    def _written(self):
+        if len(self) >= max_pending():
+            self.flush()
+        else:
+            self._start()
+
+    def _start(self):
+        # После fork поток не переживает, is_alive() это заметит.
+        if flush_interval() <= 0 or \
+                (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='counters-write-behind')
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait(flush_interval()):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать счётчики постов')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            likes, self._likes = self._likes, {}
+            like_deltas, self._like_deltas = self._like_deltas, Counter()
+            views, self._views = self._views, Counter()
+        if not likes and not views:
+            return 0
+        try:
+            with transaction.atomic():
+                _write_likes(likes)
+                _write_views(views)
+        except Exception:
+            self._restore(likes, like_deltas, views)
+            raise
+        if likes:
+            feed_cache.bump_posts({post_id for post_id, _ in likes})
+        return len(likes) + len(views)
+
+    def _restore(self, likes, like_deltas, views):
+        with self._lock:
+            for key, liked in likes.items():
+                # То, что пришло во время записи, новее.
+                self._likes.setdefault(key, liked)
+            self._like_deltas.update(like_deltas)
+            self._views.update(views)
+
+
+def _write_likes(likes):
+    if not likes:
+        return
+    Like.objects.bulk_create(
+        [Like(post_id=post_id, user_id=user_id)
+         for (post_id, user_id), liked in likes.items() if liked],
+        batch_size=500, ignore_conflicts=True,
+    )
+    removed = defaultdict(list)
+    for (post_id, user_id), liked in likes.items():
+        if not liked:
+            removed[post_id].append(user_id)
+    for post_id, user_ids in removed.items():
+        Like.objects.filter(post_id=post_id, user_id__in=user_ids).delete()
+    # Другой процесс мог записать те же лайки, поэтому счётчик не
+    # сдвигается, а пересчитывается по строкам связи.
+    counters.recount_likes({post_id for post_id, _ in likes})
+
+
+def _write_views(views):
+    by_delta = defaultdict(list)
+    for post_id, delta in views.items():
+        by_delta[delta].append(post_id)
+    for delta, post_ids in by_delta.items():
+        Post.objects.filter(pk__in=post_ids).update(
+            view_count=F('view_count') + delta)
+
+
+buffer = CounterBuffer()
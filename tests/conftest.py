@@ -1,4 +1,14 @@
+import pytest
+
+from yatube.testing import test_settings
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def project_test_settings():
+    with test_settings():
+        yield
@@ -0,0 +1,21 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``. Django 2.2 has no ASGI handler, so the WSGI application
+is wrapped by yatube.asgi_bridge: slow clients are served by the event
+loop and Django runs in a pool of ASGI_WORKERS threads.
+
+Run it with any ASGI server, e.g. ``uvicorn yatube.asgi:application``.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+from yatube.asgi_bridge import WSGIBridge
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WSGIBridge(get_wsgi_application(),
+                         workers=int(os.getenv('ASGI_WORKERS', 8)))
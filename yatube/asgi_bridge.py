@@ -0,0 +1,170 @@
+"""ASGI-обёртка над WSGI-приложением.
+
+Django 2.2 не умеет асинхронных представлений, но основную часть
+времени поток WSGI-сервера занят не Django, а медленным клиентом:
+ждёт тело запроса и ждёт, пока клиент заберёт ответ. Здесь эта работа
+идёт в цикле событий: тело запроса читается асинхронно (большое
+сбрасывается во временный файл), приложение вызывается в пуле из
+workers потоков, а ответ отправляется клиенту уже после того, как поток
+освободился. Ответ до BUFFER_SIZE байт буферизуется целиком; дальше
+каждый следующий кусок потокового ответа берётся из пула по одному,
+чтобы не держать поток, пока медленный клиент читает.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+BUFFER_SIZE = 256 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+
+class WSGIBridge:
+    def __init__(self, application, workers=8):
+        self.application = application
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI scope: %s' % scope['type'])
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers, chunks, rest = await loop.run_in_executor(
+                self.executor, self.run, self.environ(scope, body))
+        finally:
+            body.close()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers})
+        try:
+            for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            while rest is not None:
+                chunk = await loop.run_in_executor(self.executor, next,
+                                                   rest, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if rest is not None:
+                await loop.run_in_executor(self.executor, rest.close)
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            # WSGI передаёт путь байтами, декодированными как latin-1.
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            if name in environ:
+                # Cookie в HTTP/2 может прийти несколькими заголовками.
+                separator = '; ' if name == 'HTTP_COOKIE' else ','
+                value = environ[name] + separator + value
+            environ[name] = value
+        if 'CONTENT_LENGTH' not in environ:
+            # Без content-length (chunked, HTTP/2) Django читает пустое
+            # тело, поэтому длину берём у уже прочитанного тела.
+            environ['CONTENT_LENGTH'] = str(body.seek(0, 2))
+            body.seek(0)
+        return environ
+
+    def run(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+            return chunks.append
+
+        chunks = []
+        result = self.application(environ, start_response)
+        iterator = iter(result)
+        size = 0
+        rest = None
+        try:
+            for chunk in iterator:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= BUFFER_SIZE:
+                    rest = iterator
+                    break
+        finally:
+            if rest is None and hasattr(result, 'close'):
+                result.close()
+        if rest is not None:
+            rest = _Rest(iterator, result)
+        return response['status'], response['headers'], chunks, rest
+
+
+class _Rest:
+    """Остаток потокового ответа; close() закрывает сам ответ."""
+
+    def __init__(self, iterator, result):
+        self.iterator = iterator
+        self.result = result
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.iterator)
+
+    def close(self):
+        if hasattr(self.result, 'close'):
+            self.result.close()
@@ -0,0 +1,244 @@
+"""Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+База открывается в режиме WAL: читатели не ждут писателей, а запись
+идёт короткими транзакциями BEGIN IMMEDIATE, поэтому incr() атомарен
+между процессами. Целые числа хранятся как INTEGER, остальные значения
+в pickle. Устаревшие записи удаляются при чтении и при чистке. Когда
+записей больше MAX_ENTRIES, удаляется 1/CULL_FREQUENCY самых давно
+читанных записей.
+Время чтения обновляется не чаще раза в LRU_RESOLUTION секунд, чтобы
+чтение почти никогда не превращалось в запись.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+INT64 = range(-2 ** 63, 2 ** 63)
+
+
+def _dump(value):
+    if type(value) is int and value in INT64:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _load(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._lru_resolution = float(options.get('LRU_RESOLUTION', 60))
+        self._cull_every = int(options.get('CULL_EVERY', 64))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            self._local.db, self._local.pid = db, pid
+        return db
+
+    def _write(self, statements):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(db)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    def _keys(self, keys, version):
+        result = {}
+        for key in keys:
+            made = self.make_key(key, version=version)
+            self.validate_key(made)
+            result[made] = key
+        return result
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        found = self._get_many([key])
+        return found[key] if key in found else default
+
+    def get_many(self, keys, version=None):
+        keys = self._keys(keys, version)
+        found = self._get_many(list(keys))
+        return {keys[made]: value for made, value in found.items()}
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            'WHERE key IN (%s)' % ', '.join('?' * len(keys)), keys,
+        ).fetchall()
+        found, expired, touched = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[key] = _load(value)
+            if accessed < now - self._lru_resolution:
+                touched.append(key)
+        if expired or touched:
+            def update(db):
+                db.executemany('DELETE FROM cache WHERE key = ? '
+                               'AND expires <= ?',
+                               [(key, now) for key in expired])
+                db.executemany('UPDATE cache SET accessed = ? WHERE key = ?',
+                               [(now, key) for key in touched])
+            self._write(update)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set_many({key: value}, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = self._keys(data, version)
+        self._set_many({made: data[key] for made, key in keys.items()},
+                       timeout)
+        return []
+
+    def _set_many(self, data, timeout):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [(key, _dump(value), expires, now)
+                for key, value in data.items()]
+        self._write(lambda db: db.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)', rows))
+        self._maybe_cull(len(rows))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+
+        def insert(db):
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (key, now))
+            return db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)', (key, _dump(value), expires, now),
+            ).rowcount == 1
+        added = self._write(insert)
+        if added:
+            self._maybe_cull(1)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        return self._write(lambda db: db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (expires, now, key, now),
+        ).rowcount == 1)
+
+    def incr(self, key, delta=1, version=None):
+        made = self.make_key(key, version=version)
+        self.validate_key(made)
+        now = time.time()
+
+        def increment(db):
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (made, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            if not isinstance(row[0], int):
+                raise TypeError("Value of key '%s' is not an integer" % key)
+            value = row[0] + delta
+            db.execute('UPDATE cache SET value = ?, accessed = ? '
+                       'WHERE key = ?', (_dump(value), now, made))
+            return value
+        return self._write(increment)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(self._keys(keys, version))
+        if keys:
+            self._write(lambda db: db.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        self._write(lambda db: db.execute('DELETE FROM cache'))
+
+    def _maybe_cull(self, written):
+        self._writes += written
+        if self._writes >= self._cull_every:
+            self._writes = 0
+            self.cull()
+
+    def cull(self):
+        """Удаляет устаревшие записи, а если их всё ещё больше
+        MAX_ENTRIES — ещё и самые давно читанные."""
+        def delete(db):
+            db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+                return
+            extra = count - self._max_entries
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                (max(extra, count // self._cull_frequency),),
+            )
+        self._write(delete)
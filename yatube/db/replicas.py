@@ -0,0 +1,148 @@
+"""Чтение с реплик.
+
+Представления, помеченные read_only, читают из реплик REPLICA_DATABASES,
+всё остальное и любая запись идут в default. Реплики отстают от
+основной базы, поэтому клиент, который только что что-то записал,
+REPLICA_PIN_SECONDS секунд читает из default: PrimaryPinMiddleware
+ставит ему cookie после POST и после pin_primary(). Так пользователь
+сразу видит свой пост, комментарий или подписку.
+
+Для SQLite репликой служит копия файла базы, которую обновляет команда
+snapshot_replica. Запрос читает из одной реплики, а её снимок (generation)
+входит в ключи кэша лент: иначе отставшие строки, прочитанные после
+записи, закэшировались бы под новой версией ленты до следующей записи.
+Снимок записан в саму копию и читается через то же соединение, что и
+данные: открытое соединение продолжает читать подменённый файл.
+"""
+import random
+import sqlite3
+import time
+import uuid
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PIN_COOKIE = 'primary_pin'
+GENERATION_TABLE = 'replica_generation'
+
+_replica = ContextVar('replica', default=None)
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current_replica() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них можно связывать.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+
+def current_replica():
+    alias = _replica.get()
+    return alias if alias in replicas() else None
+
+
+def _new_generation():
+    # Формат как у версий лент: секунды, точка, остальное.
+    return '%d.%s' % (time.time(), uuid.uuid4().hex)
+
+
+def generation():
+    """Снимок, из которого читает текущий запрос: '' для default.
+
+    Снимок записывает в копию snapshot(). Одно соединение SQLite всё
+    время читает один и тот же файл, поэтому снимок запоминается до
+    переподключения.
+    """
+    alias = current_replica()
+    if alias is None:
+        return ''
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        cached = getattr(connection, 'replica_generation', None)
+        if cached is not None and cached[0] is connection.connection:
+            return cached[1]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT generation FROM %s' % GENERATION_TABLE)
+            row = cursor.fetchone()
+    except DatabaseError:
+        row = None
+    if row is None:
+        # Снимок неизвестен: значение не повторится, и кэш не сработает.
+        return _new_generation()
+    connection.replica_generation = (connection.connection, row[0])
+    return row[0]
+
+
+def pin_primary(request):
+    """Следующие запросы клиента читают из default, см. модуль."""
+    request.pin_primary = True
+
+
+def read_only(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if PIN_COOKIE in request.COOKIES or not replicas():
+            return view(request, *args, **kwargs)
+        # Одна реплика на весь запрос: у разных реплик разные снимки.
+        token = _replica.set(random.choice(replicas()))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+class PrimaryPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        wrote = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') \
+            and response.status_code < 400
+        if wrote or getattr(request, 'pin_primary', False):
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(),
+                                httponly=True, samesite='Lax')
+        return response
+
+
+def snapshot(source, target):
+    """Копирует базу SQLite source в файл target через backup API.
+
+    Копия согласована даже при идущей записи в source. Журнал копии
+    переводится в DELETE: файл WAL остался бы привязан к старой копии.
+    В копию записывается её снимок, см. generation().
+    """
+    source = sqlite3.connect(source)
+    try:
+        copy = sqlite3.connect(target)
+        try:
+            source.backup(copy)
+            copy.execute('PRAGMA journal_mode = DELETE')
+            copy.execute('CREATE TABLE %s (generation TEXT NOT NULL)'
+                         % GENERATION_TABLE)
+            copy.execute('INSERT INTO %s VALUES (?)' % GENERATION_TABLE,
+                         [_new_generation()])
+            copy.commit()
+        finally:
+            copy.close()
+    finally:
+        source.close()
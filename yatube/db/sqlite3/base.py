@@ -0,0 +1,53 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+При подключении включаются WAL (читатели не ждут писателя),
+synchronous=NORMAL, mmap и большой кэш страниц, а busy_timeout
+заставляет ждать блокировку, а не сразу падать с «database is locked».
+
+Транзакции начинаются с BEGIN IMMEDIATE. При обычном BEGIN транзакция,
+которая сначала читает, а потом пишет, пытается повысить блокировку
+посреди работы. Если в это время пишет кто-то ещё, SQLite возвращает
+SQLITE_BUSY сразу, без ожидания, потому что иначе была бы взаимная
+блокировка. IMMEDIATE берёт блокировку на запись в начале транзакции,
+и там busy_timeout работает.
+
+Настройки переопределяются в OPTIONS: 'pragmas' — словарь прагм,
+'transaction_mode' — 'IMMEDIATE', 'EXCLUSIVE' или 'DEFERRED'.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = dict(PRAGMAS, **kwargs.pop('pragmas', {}))
+        mode = kwargs.pop('transaction_mode', 'IMMEDIATE').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                "transaction_mode must be one of %s." %
+                ', '.join(TRANSACTION_MODES))
+        self.transaction_mode = mode
+        # Таймаут модуля sqlite3 — тот же busy_timeout, только в секундах.
+        kwargs.setdefault('timeout', self.pragmas['busy_timeout'] / 1000)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute('PRAGMA %s = %s' % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN ' + self.transaction_mode)
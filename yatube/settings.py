@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'yatube.db.replicas.PrimaryPinMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -88,17 +89,43 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Tests run with the overrides from yatube.testing: a per-process cache
+# and no background threads.
+TEST_RUNNER = 'yatube.testing.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# yatube.db.sqlite3 is the stock backend plus WAL and other pragmas and
+# BEGIN IMMEDIATE transactions, see its docstring. Connections are kept
+# for DB_CONN_MAX_AGE seconds instead of being opened on every request.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Read replicas: comma-separated SQLite files in DB_REPLICAS, refreshed by
+# `manage.py snapshot_replica`. Views marked read_only read from them,
+# except for clients that wrote something in the last REPLICA_PIN_SECONDS.
+REPLICA_DATABASES = []
+for number, path in enumerate(filter(None,
+                                     os.getenv('DB_REPLICAS', '').split(',')),
+                              start=1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'yatube.db.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'OPTIONS': {'pragmas': {'journal_mode': 'DELETE', 'query_only': 1}},
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{number}')
+DATABASE_ROUTERS = ['yatube.db.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -152,11 +179,101 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
-CACHES = {
-    'default': {
+# CACHE_BACKEND=sqlite shares one cache file between all worker processes,
+# locmem keeps a separate cache in every process, db uses the cache_table
+# table (create it with `manage.py createcachetable`).
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table',
+    },
 }
+CACHES = {
+    'default': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'sqlite')],
+}
+
+# 'page' keeps numbered ?page= pagination in feeds, 'cursor' switches them
+# to keyset ?cursor= pagination. A ?cursor= parameter always wins.
+POSTS_PAGINATION = 'page'
+
+# Full-text search backend for posts and comments. SQLiteFTSBackend needs
+# the FTS5 extension, DatabaseBackend works anywhere without an index.
+POSTS_SEARCH_BACKEND = 'posts.search.backends.SQLiteFTSBackend'
+# SQLiteFTSBackend counts and ranks only this many of the newest matching
+# posts and comments, so a common word costs as much as a rare one.
+POSTS_SEARCH_MAX_CANDIDATES = 1000
+
+# The in-memory autocomplete index is refreshed by signals in this process
+# and fully rebuilt in the background after this many seconds.
+SUGGEST_REBUILD_INTERVAL = 600
+# Build the index in the background on the first request to a process
+# instead of on the first suggestion.
+SUGGEST_WARM_UP = True
+
+# Feed fragments are keyed by feed versions that signals bump on every
+# change, so they can live long without showing stale posts.
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Anonymous feed pages are public: proxies and cache_page may keep them for
+# MAX_AGE seconds and serve them stale for STALE_WHILE_REVALIDATE more while
+# they revalidate with the ETag. Logged-in users always get private pages.
+FEED_CACHE_MAX_AGE = 0
+FEED_CACHE_STALE_WHILE_REVALIDATE = 60
+
+# Threads that build post thumbnails after a post is saved; 0 builds them
+# inline right after the transaction commits.
+THUMBNAIL_WORKERS = 2
+
+# Uploaded post images: bigger files or more pixels are rejected before the
+# image is decoded, the rest is downscaled to MAX_SIDE and re-encoded
+# without EXIF and other metadata.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_QUALITY = 85
+
+# Widths and formats of the srcset variants built for every post image,
+# and the sizes attribute that tells the browser how wide the image is.
+THUMBNAIL_VARIANT_WIDTHS = (320, 640, 960)
+THUMBNAIL_VARIANT_FORMATS = ('WEBP', 'JPEG')
+THUMBNAIL_SIZES = '(max-width: 980px) 100vw, 960px'
+
+# Comment replies are shown inline down to this depth; deeper branches
+# are loaded on demand. A thread shows at most REPLIES_PER_THREAD replies
+# at a time, the rest is loaded page by page.
+COMMENTS_MAX_DEPTH = 3
+COMMENTS_REPLIES_PER_THREAD = 20
+
+# Opt-in write-behind for likes and view counts: changes are buffered in
+# memory and written in one transaction every FLUSH_INTERVAL seconds, or
+# right away once MAX_PENDING changes are waiting. A crash loses at most
+# that much; a normal shutdown flushes the buffer.
+POST_COUNTERS_WRITE_BEHIND = False
+POST_COUNTERS_FLUSH_INTERVAL = 2
+POST_COUNTERS_MAX_PENDING = 1000
+# View counts always go through that buffer: a synchronous UPDATE on every
+# post page view would queue readers behind one hot row. False stops
+# counting views unless POST_COUNTERS_WRITE_BEHIND is on.
+POST_VIEWS_WRITE_BEHIND = True
+
+# Authors with more followers than this are not fanned out on write;
+# their posts are merged into the follow feed at read time instead.
+TIMELINE_FANOUT_LIMIT = 1000
+# A new follow copies only this many of the author's newest posts into
+# the follower's timeline. An author who drops back to the fan-out limit
+# is fanned out again in TIMELINE_WORKERS background threads (0 runs it
+# inline right after the transaction commits).
+TIMELINE_BACKFILL_LIMIT = 200
+TIMELINE_WORKERS = 1
 
 INTERNAL_IPS = [
     '127.0.0.1',
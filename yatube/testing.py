@@ -0,0 +1,36 @@
+"""Настройки, с которыми идут тесты.
+
+Настройки проекта одинаковы везде, а тесты переопределяют их на время
+прогона, как DiscoverRunner переопределяет EMAIL_BACKEND. Общий файл
+кэша тесты не очищают, миниатюры строятся сразу, а потоки, которые
+пишут в базу или читают её мимо транзакции теста, не запускаются.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'THUMBNAIL_WORKERS': 0,
+    'TIMELINE_WORKERS': 0,
+    'POST_VIEWS_WRITE_BEHIND': False,
+    'SUGGEST_WARM_UP': False,
+}
+
+
+def test_settings():
+    return override_settings(**TEST_SETTINGS)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = test_settings()
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,311 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connections, router
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from yatube.asgi_bridge import BUFFER_SIZE, WSGIBridge
+from yatube.cache import SQLiteCache
+from posts import feed_cache
+from yatube.db.replicas import PIN_COOKIE, read_only, snapshot
+from yatube.db.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Значения видны другому экземпляру кэша с тем же файлом"""
+        self.cache.set('post', {'text': 'Текст'})
+        self.cache.set_many({'a': 1, 'b': [2]})
+        other = self.make_cache()
+        self.assertEqual(other.get('post'), {'text': 'Текст'})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2]})
+        other.delete('post')
+        self.assertIsNone(self.cache.get('post'))
+
+    def test_timeout(self):
+        """Запись пропадает после истечения срока, add() её заменяет"""
+        self.cache.set('key', 'value', 0.05)
+        self.assertEqual(self.cache.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr_is_atomic_across_connections(self):
+        """incr() из нескольких потоков не теряет приращений"""
+        self.cache.set('counter', 0)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+        def work():
+            cache = self.make_cache()
+            for _ in range(50):
+                cache.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_least_recently_used_entries_are_culled(self):
+        """При переполнении удаляются давно не читанные записи"""
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_EVERY=1,
+                                LRU_RESOLUTION=0)
+        cache.set('hot', 'value')
+        for number in range(20):
+            cache.get('hot')
+            cache.set('key%d' % number, number)
+        self.assertEqual(cache.get('hot'), 'value')
+        self.assertIsNone(cache.get('key0'))
+        self.assertLessEqual(
+            len(cache.get_many(['key%d' % n for n in range(20)])), 10)
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.connections = []
+
+    def tearDown(self):
+        for connection in self.connections:
+            connection.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_connection(self, **options):
+        connection = DatabaseWrapper({
+            'ENGINE': 'yatube.db.sqlite3',
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            'OPTIONS': options,
+            'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False,
+            'CONN_MAX_AGE': 0,
+            'TIME_ZONE': None,
+        })
+        self.connections.append(connection)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA ' + name)
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connect(self):
+        """Прагмы из бэкенда и из OPTIONS применяются при подключении"""
+        connection = self.make_connection(pragmas={'cache_size': -1000})
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(connection, 'cache_size'), -1000)
+
+    def test_transactions_take_write_lock_at_begin(self):
+        """BEGIN IMMEDIATE берет блокировку на запись в начале транзакции"""
+        first = self.make_connection()
+        second = self.make_connection(pragmas={'busy_timeout': 50})
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE posts (id INTEGER PRIMARY KEY)')
+        first._start_transaction_under_autocommit()
+        with first.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM posts')
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            with second.cursor() as cursor:
+                cursor.execute('INSERT INTO posts DEFAULT VALUES')
+        first.commit()
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    @override_settings(REPLICA_DATABASES=['replica'])
+    def test_read_only_views_read_from_replica(self):
+        """read_only читает из реплики, если клиент недавно не писал"""
+        view = read_only(lambda request: router.db_for_read(None))
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/')), 'replica')
+        factory.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(view(factory.get('/')), 'default')
+        self.assertEqual(router.db_for_read(None), 'default')
+        self.assertEqual(router.db_for_write(None), 'default')
+
+    @override_settings(REPLICA_DATABASES=['replica'])
+    def test_feed_versions_follow_replica_snapshot(self):
+        """Версии лент с реплики меняются вместе со снимком соединения"""
+        view = read_only(lambda request: feed_cache.versions(['global']))
+        request = RequestFactory().get('/')
+        primary = feed_cache.versions(['global'])
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'db.sqlite3')
+            path = os.path.join(directory, 'replica.sqlite3')
+            sqlite3.connect(source).close()
+            snapshot(source, path)
+            with mock.patch.dict(connections.databases, {'replica': {
+                    'ENGINE': 'yatube.db.sqlite3', 'NAME': path}}):
+                try:
+                    first = view(request)
+                    self.assertEqual(first[:1], primary)
+                    self.assertEqual(view(request), first)
+                    # Открытое соединение читает старый файл и старый снимок.
+                    snapshot(source, path + '.tmp')
+                    os.replace(path + '.tmp', path)
+                    self.assertEqual(view(request), first)
+                    connections['replica'].close()
+                    self.assertNotEqual(view(request), first)
+                    # Без снимка в базе кэш не используется.
+                    connections['replica'].close()
+                    os.remove(path)
+                    self.assertNotEqual(view(request), view(request))
+                finally:
+                    connections['replica'].close()
+                    del connections['replica']
+        self.assertEqual(feed_cache.versions(['global']), primary)
+
+    def test_writes_pin_client_to_primary(self):
+        """После записи клиент читает из основной базы"""
+        response = self.client.get(reverse('index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = self.client.post(reverse('new_post'), {'text': 'Пост'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('profile_follow',
+                                      kwargs={'username': 'author'}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class SnapshotTests(SimpleTestCase):
+    def test_snapshot_copies_database(self):
+        """Снимок — отдельная база с журналом DELETE"""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'db.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            database = sqlite3.connect(source)
+            database.execute('PRAGMA journal_mode = WAL')
+            database.execute('CREATE TABLE posts (text TEXT)')
+            database.execute("INSERT INTO posts VALUES ('Пост')")
+            database.commit()
+            snapshot(source, target)
+            database.close()
+
+            replica = sqlite3.connect(target)
+            self.assertEqual(replica.execute('SELECT text FROM posts')
+                             .fetchall(), [('Пост',)])
+            self.assertEqual(replica.execute('PRAGMA journal_mode')
+                             .fetchone(), ('delete',))
+            self.assertEqual(len(replica.execute(
+                'SELECT generation FROM replica_generation').fetchall()), 1)
+            replica.close()
+
+
+class WSGIBridgeTests(SimpleTestCase):
+    def call(self, application, scope, body_parts):
+        bridge = WSGIBridge(application, workers=2)
+        messages = [{'type': 'http.request', 'body': part, 'more_body': True}
+                    for part in body_parts]
+        messages[-1]['more_body'] = False
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        try:
+            asyncio.run(bridge(scope, receive, send))
+        finally:
+            bridge.executor.shutdown()
+        return sent
+
+    def test_request_is_translated_to_wsgi(self):
+        """Запрос ASGI превращается в environ, ответ — в сообщения ASGI"""
+        def application(environ, start_response):
+            start_response('201 Created', [('Content-Type', 'text/plain')])
+            return [' '.join([
+                environ['REQUEST_METHOD'], environ['PATH_INFO'],
+                environ['QUERY_STRING'], environ['HTTP_X_TAG'],
+                environ['CONTENT_TYPE'],
+            ]).encode('latin-1'), environ['wsgi.input'].read()]
+
+        sent = self.call(application, {
+            'type': 'http', 'method': 'POST', 'path': '/new/',
+            'query_string': b'a=1', 'headers': [
+                (b'x-tag', b'one'), (b'x-tag', b'two'),
+                (b'content-type', b'text/plain'),
+            ],
+        }, [b'hello ', b'world'])
+        self.assertEqual(sent[0], {
+            'type': 'http.response.start', 'status': 201,
+            'headers': [(b'content-type', b'text/plain')],
+        })
+        self.assertEqual(b''.join(message.get('body', b'')
+                                  for message in sent[1:]),
+                         b'POST /new/ a=1 one,two text/plainhello world')
+        self.assertFalse(sent[-1].get('more_body', False))
+
+    def test_body_without_content_length(self):
+        """Тело без content-length доходит до Django, cookie склеиваются"""
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            length = int(environ['CONTENT_LENGTH'])
+            return [environ['HTTP_COOKIE'].encode('latin-1'), b' ',
+                    environ['wsgi.input'].read(length)]
+
+        sent = self.call(application, {
+            'type': 'http', 'method': 'POST', 'path': '/', 'headers': [
+                (b'cookie', b'a=1'), (b'cookie', b'b=2'),
+            ],
+        }, [b'text=', b'hello'])
+        self.assertEqual(b''.join(message.get('body', b'')
+                                  for message in sent[1:]),
+                         b'a=1; b=2 text=hello')
+
+    def test_long_response_is_streamed_and_closed(self):
+        """Длинный ответ отдается по частям, затем закрывается"""
+        closed = []
+
+        class Response:
+            def __iter__(self):
+                for _ in range(4):
+                    yield b'x' * (BUFFER_SIZE // 2)
+
+            def close(self):
+                closed.append(True)
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return Response()
+
+        sent = self.call(application, {'type': 'http', 'method': 'GET',
+                                       'path': '/'}, [b''])
+        self.assertEqual(sum(len(message.get('body', b''))
+                             for message in sent), BUFFER_SIZE * 2)
+        self.assertEqual(closed, [True])